@@ -0,0 +1,186 @@
+from pathlib import Path
+import datetime as dt
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from data_access import CACHE_DIR, compactar, load_sales, ordenar_por_periodo, read_table
+from gerador_dataset import ANOMALIAS_PADRAO, gerar_grande
+from clean_data import ordenar_temporalmente
+from model_train import split_positions, split_temporal
+from metrics_engine import segment_codes, segment_metrics, split_metrics
+from dashboard_data import normalize_columns, preparar_datas, top_clientes, top_produtos, vendas_mensais
+from feature_cache import load_design, source_groups
+from feature_importance import permutation_importance_by_source
+
+# =========================
+# Benchmarks das funções centrais de cada etapa
+# =========================
+# As fixtures vêm do gerador (gerar_grande, mesma semente => mesmos dados) e ficam em
+# data/cache/bench/: <n>_raw.parquet (com anomalias, entrada do clean_data) e
+# <n>_clean.parquet (sem anomalias, entrada de model_train / dashboard).
+# Cada benchmark corre `--repeticoes` vezes (tempo mínimo e mediano) e uma vez extra
+# sob tracemalloc (pico de memória Python/NumPy). Os resultados são acrescentados a
+# reports/benchmark_history.jsonl (um registo JSON por benchmark×tamanho, com o
+# commit); a mediana é comparada com o último registo de OUTRO commit e um aumento
+# acima de `--tolerancia` (20% por omissão) é marcado como regressão.
+# O grupo "model" usa a matriz codificada da fixture (feature_cache) e um Random Forest
+# pequeno e fixo (BENCH_ARVORES árvores, sem rf_params.json, para não depender do tuning),
+# treinado numa amostra fixa de BENCH_AMOSTRA linhas de treino; o predict e a permutation
+# importance correm sobre o hold-out temporal (esta última também limitada a BENCH_AMOSTRA).
+#
+#   python src/benchmark.py [--tamanhos=1k,100k,1M,10M] [--repeticoes=5] [--so=split,model,dashboard]
+#                           [--tolerancia=0.2] [--falhar]   (--falhar: exit 1 se houver regressões)
+ROOT = Path(".").resolve()
+BENCH_DIR = CACHE_DIR / "bench"
+HISTORY = ROOT / "reports" / "benchmark_history.jsonl"
+
+FLAGS = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "1")
+             for a in sys.argv[1:] if a.startswith("--"))
+TAMANHOS = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+TOLERANCIA = float(FLAGS.get("tolerancia", 0.2))
+BENCH_ARVORES = 10          # árvores do Random Forest dos benchmarks "model"
+BENCH_AMOSTRA = 20_000      # linhas de treino do fit / do hold-out na permutation importance
+
+def fixture(n: int, anomalias: bool) -> Path:
+    """Parquet gerado uma vez por tamanho (reutilizado entre execuções)."""
+    out = BENCH_DIR / f"{n}_{'raw' if anomalias else 'clean'}.parquet"
+    if not out.exists():
+        t0 = time.perf_counter()
+        gerar_grande(n, out, bloco=min(n, 1_000_000), anomalias=ANOMALIAS_PADRAO if anomalias else None)
+        print(f"🧮 Fixture {out.name} gerada em {time.perf_counter() - t0:.1f}s")
+    return out
+
+def _rf() -> RandomForestRegressor:
+    return RandomForestRegressor(n_estimators=BENCH_ARVORES, random_state=42, n_jobs=-1)
+
+def contexto(n: int, grupos: set | None = None) -> dict:
+    """Dados já lidos para os benchmarks (a leitura não entra nos tempos, exceto em 'load_sales')."""
+    raw, clean = fixture(n, True), fixture(n, False)
+    df = load_sales(clean, verbose=False)
+    y = df["Vendas"].to_numpy(dtype=np.float64)
+    pred = y * np.random.default_rng(0).normal(1.0, 0.1, len(y))
+    train_pos, test_pos = split_positions(df)
+    ctx = {"n": n, "raw_path": raw, "clean_path": clean, "raw": read_table(raw),
+           "clean_raw": read_table(clean), "df": df, "y": y, "pred": pred,
+           "train_pos": train_pos, "test_pos": test_pos, "codes": segment_codes(df),
+           "dash": preparar_datas(normalize_columns(df))}
+    if not grupos or "model" in grupos:
+        # matriz codificada (cache do feature_cache) + modelo já treinado para o predict
+        _, preproc, X, _ = load_design(clean, verbose=False)
+        treino = np.arange(len(y))[train_pos]
+        treino = np.sort(np.random.default_rng(0).choice(treino, min(BENCH_AMOSTRA, len(treino)), replace=False))
+        ctx.update(X_fit=X[treino], y_fit=y[treino], X_test=X[test_pos], y_test=y[test_pos],
+                   groups=source_groups(preproc))
+        ctx["rf"] = _rf().fit(ctx["X_fit"], ctx["y_fit"])
+    return ctx
+
+# nome -> (grupo, função(ctx)); o grupo serve para filtrar com --so
+BENCHMARKS = {
+    "clean_data.ordenar_temporalmente": ("clean", lambda c: ordenar_temporalmente(c["raw"].copy(deep=False))),
+    "data_access.compactar":            ("load", lambda c: compactar(c["clean_raw"])),
+    "data_access.ordenar_por_periodo":  ("load", lambda c: ordenar_por_periodo(compactar(c["clean_raw"]))),
+    "data_access.load_sales":           ("load", lambda c: load_sales(c["clean_path"], verbose=False)),
+    "model_train.split_temporal":       ("split", lambda c: split_temporal(c["df"], "Vendas")),
+    "model_train.split_positions":      ("split", lambda c: split_positions(c["df"])),
+    "metrics_engine.split_metrics":     ("evaluate", lambda c: split_metrics(c["y"], c["pred"], c["train_pos"], c["test_pos"])),
+    "metrics_engine.segment_metrics":   ("evaluate", lambda c: segment_metrics(
+        c["y"], c["pred"], c["codes"], {"Teste": c["test_pos"], "Global": slice(None)})),
+    "model_train.random_forest_fit":    ("model", lambda c: _rf().fit(c["X_fit"], c["y_fit"])),
+    "model_train.random_forest_predict": ("model", lambda c: c["rf"].predict(c["X_test"])),
+    "feature_importance.permutation_importance_by_source": ("model", lambda c: permutation_importance_by_source(
+        c["rf"], c["X_test"], c["y_test"], c["groups"], repeats=2, sample=BENCH_AMOSTRA)),
+    "dashboard.vendas_mensais":         ("dashboard", lambda c: vendas_mensais(c["dash"])),
+    "dashboard.top_clientes":           ("dashboard", lambda c: top_clientes(c["dash"])),
+    "dashboard.top_produtos":           ("dashboard", lambda c: top_produtos(c["dash"])),
+}
+
+def medir(fn, ctx: dict, repeticoes: int) -> dict:
+    """Tempos (min/mediana/desvio) em `repeticoes` execuções + pico tracemalloc numa execução extra."""
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn(ctx)
+        tempos.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn(ctx)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"min_s": min(tempos), "mediana_s": statistics.median(tempos),
+            "desvio_s": statistics.pstdev(tempos), "pico_mb": pico / 1e6}
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=ROOT).stdout.strip()
+    except Exception:
+        return "desconhecido"
+
+def ler_historico(path: Path = HISTORY) -> list:
+    if not path.exists():
+        return []
+    return [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines() if l.strip()]
+
+def marcar_regressoes(registos: list, historico: list, tolerancia: float = TOLERANCIA) -> list:
+    """Compara cada registo com o último do mesmo benchmark×tamanho feito noutro commit."""
+    ultimo = {}
+    for h in historico:
+        ultimo.setdefault((h["benchmark"], h["linhas"]), {})[h["commit"]] = h
+    for r in registos:
+        anteriores = [h for c, h in ultimo.get((r["benchmark"], r["linhas"]), {}).items() if c != r["commit"]]
+        ref = max(anteriores, key=lambda h: h["quando"]) if anteriores else None
+        r["ref_commit"] = ref["commit"] if ref else None
+        r["variacao"] = r["mediana_s"] / ref["mediana_s"] - 1 if ref and ref["mediana_s"] > 0 else None
+        r["regressao"] = r["variacao"] is not None and r["variacao"] > tolerancia
+    return registos
+
+def main():
+    tamanhos = [t.strip() for t in FLAGS.get("tamanhos", ",".join(TAMANHOS)).split(",") if t.strip()]
+    repeticoes = int(FLAGS.get("repeticoes", 5))
+    grupos = set(FLAGS["so"].split(",")) if "so" in FLAGS else None
+    commit, quando = _commit(), dt.datetime.now().isoformat(timespec="seconds")
+
+    registos = []
+    for t in tamanhos:
+        n = TAMANHOS[t] if t in TAMANHOS else int(t)
+        ctx = contexto(n, grupos)
+        for nome, (grupo, fn) in BENCHMARKS.items():
+            if grupos and grupo not in grupos:
+                continue
+            r = medir(fn, ctx, repeticoes)
+            registos.append({"benchmark": nome, "linhas": n, "repeticoes": repeticoes, **r,
+                             "commit": commit, "quando": quando})
+            print(f"⏱️ {nome:<52} {n:>11,} linhas  mediana {r['mediana_s'] * 1e3:10.2f} ms"
+                  f"  pico {r['pico_mb']:9.1f} MB")
+        del ctx
+
+    historico = ler_historico()
+    marcar_regressoes(registos, historico)
+    HISTORY.parent.mkdir(parents=True, exist_ok=True)
+    with HISTORY.open("a", encoding="utf-8") as f:
+        for r in registos:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    regressoes = [r for r in registos if r["regressao"]]
+    print(f"\n📂 {len(registos)} resultados acrescentados a {HISTORY} "
+          f"(RSS máximo do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB)")
+    if regressoes:
+        print(f"⚠️ {len(regressoes)} regressões (> {TOLERANCIA:.0%} mais lento que o último commit medido):")
+        print(pd.DataFrame(regressoes)[["benchmark", "linhas", "ref_commit", "mediana_s", "variacao"]]
+                .to_string(index=False))
+        if "falhar" in FLAGS:
+            sys.exit(1)
+    else:
+        print("✅ Sem regressões face ao histórico")
+
+if __name__ == "__main__":
+    main()
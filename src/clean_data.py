@@ -1,19 +1,45 @@
 from pathlib import Path
+import hashlib
+import json
 import sys
 import pandas as pd
 import numpy as np
-from scipy.stats import zscore
+
+from data_access import atualizar_vocab, file_hash, read_table, iter_chunks
+from outliers import mascara_outliers, parse_regras, descrever_regra
+from client_names import NormalizadorClientes, ler_lista_mestre, LIMIAR_PADRAO
+from instrumentacao import etapa, instrumentar
 
 ROOT = Path(".").resolve()
 # Permite passar o caminho do excel por argumento:
-RAW = Path(sys.argv[1]) if len(sys.argv) > 1 else ROOT / "data" / "raw" / "dataset_biagio.xlsx"
+#   python src/clean_data.py [ficheiro] [--chunked] [--chunksize=N] [--incremental]
+#                            [--outliers=z:3,mad:3.5,iqr:1.5] [--outlier-cols=Vendas,...]
+#                            [--outlier-grupos=Produto,Canal,...]
+#                            [--clientes-master=lista.csv] [--limiar-nomes=0.75]
+ARGS = [a for a in sys.argv[1:] if not a.startswith("--")]
+FLAGS = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "1")
+             for a in sys.argv[1:] if a.startswith("--"))
+RAW = Path(ARGS[0]) if ARGS else ROOT / "data" / "raw" / "dataset_biagio.xlsx"
+CHUNKED = "chunked" in FLAGS
+INCREMENTAL = "incremental" in FLAGS
+CHUNKSIZE = int(FLAGS.get("chunksize", 100_000))
+REGRAS_OUTLIERS = parse_regras(FLAGS.get("outliers"), FLAGS.get("outlier-cols"),
+                               FLAGS.get("outlier-grupos"))
+MASTER = Path(FLAGS["clientes-master"]) if "clientes-master" in FLAGS else None
+LIMIAR_NOMES = float(FLAGS.get("limiar-nomes", LIMIAR_PADRAO))
 
 OUT_DIR = ROOT / "data" / "processed"; OUT_DIR.mkdir(parents=True, exist_ok=True)
 REP_DIR = ROOT / "reports"; REP_DIR.mkdir(parents=True, exist_ok=True)
 
 OUT_XLSX = OUT_DIR / "dataset_biagio_clean.xlsx"
+OUT_PARQUET = OUT_DIR / "dataset_biagio_clean.parquet"   # saída do modo por blocos
+PART_DIR = OUT_DIR / "particoes"                          # saída do modo incremental (AAAA-MM.parquet)
+MANIFEST = PART_DIR / "_manifest.json"
 SUMMARY = REP_DIR / "cleaning_summary.txt"
 
+IMPUT_COLS = ["Vendas", "Margem_%"]
+CORR = {"Mercado Frescco": "Mercado Fresco", "Kéro": "Kero", "Shopritee": "Shoprite"}
+
 def ordenar_temporalmente(df: pd.DataFrame) -> pd.DataFrame:
     cols = set(df.columns.map(str))
     if "Data" in cols:
@@ -22,75 +48,43 @@ def ordenar_temporalmente(df: pd.DataFrame) -> pd.DataFrame:
     if {"Ano","Mês"}.issubset(cols) or {"Ano","Mes"}.issubset(cols):
         if "Mes" in cols and "Mês" not in cols:
             df = df.rename(columns={"Mes": "Mês"})
-        # mapear nomes de mês, se necessário
+        # mapear nomes de mês, se necessário (só os valores distintos, não linha a linha)
         if df["Mês"].dtype == object:
             mapa = {"jan":1,"fev":2,"mar":3,"abr":4,"mai":5,"jun":6,
                     "jul":7,"ago":8,"set":9,"out":10,"nov":11,"dez":12}
-            df["Mês"] = (df["Mês"].astype(str).str.lower()
-                         .map(mapa).fillna(pd.to_numeric(df["Mês"], errors="coerce")))
-        return df.sort_values(["Ano","Mês"], kind="mergesort")
+            codes, uniq = pd.factorize(df["Mês"])
+            uniq = pd.Series(uniq, dtype=object)
+            val = (uniq.astype(str).str.lower().map(mapa)
+                   .fillna(pd.to_numeric(uniq, errors="coerce"))).to_numpy(dtype="float64")
+            df["Mês"] = np.where(codes >= 0, val[np.maximum(codes, 0)], np.nan)
+        # ordenação estável por (Ano, Mês) com NaN no fim, como sort_values(kind="mergesort")
+        ordem = np.lexsort((pd.to_numeric(df["Mês"], errors="coerce").to_numpy(dtype="float64"),
+                            pd.to_numeric(df["Ano"], errors="coerce").to_numpy(dtype="float64")))
+        return df.iloc[ordem]
     return df  # se não houver colunas temporais
 
-def main():
-    if not RAW.exists():
-        raise FileNotFoundError(f"❌ Não encontrei o ficheiro de origem: {RAW}")
-
-    df = pd.read_excel(RAW)
-    orig_n, orig_p = df.shape
-
-    # 1) Ordenação temporal
-    df = ordenar_temporalmente(df)
-
-    # 2) Imputação de omissos (mediana) em Vendas e Margem_%
-    imput = {}
-    for c in ["Vendas", "Margem_%"]:
-        if c in df.columns:
-            n_before = int(df[c].isna().sum())
-            if n_before:
-                df[c] = df[c].fillna(df[c].median())
-            imput[c] = n_before
-
-    # 3) Remoção de outliers (|z|>3) em QUALQUER coluna numérica
-    removed = 0
-    num = df.select_dtypes(include="number")
-    if not num.empty:
-        Z = num.apply(zscore)
-        mask_ok = (Z.abs() <= 3).all(axis=1)
-        removed = int((~mask_ok).sum())
-        df = df[mask_ok].copy()
-
-    # 4) Correções de ortografia em 'Cliente'
-    corr = {"Mercado Frescco": "Mercado Fresco", "Kéro": "Kero", "Shopritee": "Shoprite"}
-    corr_counts = {}
-    if "Cliente" in df.columns:
-        for k, v in corr.items():
-            corr_counts[k] = int((df["Cliente"] == k).sum())
-        df["Cliente"] = df["Cliente"].replace(corr)
-
-    # 5) Duplicados
-    dups = int(df.duplicated().sum())
-    if dups:
-        df = df.drop_duplicates()
-
-    # 6) Guardar e escrever resumo
-    df.to_excel(OUT_XLSX, index=False)
-
+def escrever_resumo(origem, orig_n, orig_p, final_n, final_p,
+                    imput, removed, dups, corr_counts, saida,
+                    regras=REGRAS_OUTLIERS, por_regra=None, nomes=None, extra=None):
     lines = []
     lines += [
         "=== LIMPEZA DO DATASET ===",
-        f"Origem: {RAW}",
+        f"Origem: {origem}",
         f"Dimensão original: {orig_n} linhas × {orig_p} colunas",
-        f"Dimensão final   : {len(df)} linhas × {df.shape[1]} colunas",
+        f"Dimensão final   : {final_n} linhas × {final_p} colunas",
         "",
         "— Omissos imputados (mediana):"
     ]
-    for c in ["Vendas", "Margem_%"]:
+    for c in IMPUT_COLS:
         if c in imput:
             lines.append(f"  • {c}: {imput[c]} → 0")
 
+    desc = descrever_regra(regras[0]) if len(regras) == 1 else "; ".join(r["regra"] for r in regras)
+    lines += ["", f"— Outliers removidos ({desc}): {removed} linhas"]
+    if len(regras) > 1 and por_regra is not None:
+        for r, k in zip(regras, por_regra):
+            lines.append(f"  • {descrever_regra(r)}: {k} linhas")
     lines += [
-        "",
-        f"— Outliers removidos (|z|>3): {removed} linhas",
         "",
         f"— Duplicados removidos: {dups}",
         "",
@@ -98,13 +92,500 @@ def main():
     ]
     if corr_counts:
         for k, v in corr_counts.items():
-            lines.append(f"  • {k} → {corr[k]} : {v} ocorrências")
+            lines.append(f"  • {k} → {CORR[k]} : {v} ocorrências")
     else:
         lines.append("  • coluna 'Cliente' não existe; não aplicável.")
 
+    if nomes is not None:
+        correcoes, sem_corr = nomes
+        lines += [
+            "",
+            f"— Normalização de nomes (lista mestre: {MASTER}, limiar {LIMIAR_NOMES:g}):",
+            f"  • {len(correcoes)} nomes distintos corrigidos em {int(correcoes['linhas'].sum())} linhas;"
+            f" {sem_corr} sem correspondência",
+        ]
+        for r in correcoes.head(10).itertuples():
+            lines.append(f"  • {r.bruto} → {r.canonico} : {r.linhas} ocorrências")
+
+    if extra:
+        lines += [""] + extra
+
     SUMMARY.write_text("\n".join(lines), encoding="utf-8")
     print("\n".join(lines))
-    print(f"\n✅ Ficheiro limpo: {OUT_XLSX}")
+    print(f"\n✅ Ficheiro limpo: {saida}")
+
+# =========================
+# Modo por blocos (out-of-core)
+# =========================
+# 1.ª passagem: contagens, média/variância (Welford/Chan, combináveis entre blocos),
+#               mín./máx. e omissos por coluna numérica.
+# Medianas exatas: refinamento por histograma (1024 classes) com memória limitada
+#               a `cap` valores — normalmente 1–2 passagens só sobre Vendas/Margem_%.
+# 2.ª passagem: imputação, filtro |z|>3 com as estatísticas globais, correção de
+#               clientes e duplicados (impressões digitais de 64 bits das linhas,
+#               guardadas em runs ordenados que se fundem como numa LSM: cada
+#               impressão é copiada O(log N) vezes), escrita incremental em Parquet.
+# As contagens do resumo coincidem com o modo em memória; a saída só fica
+# ordenada dentro de cada bloco.
+_BINS = 1024
+
+def _ler_blocos(path: Path, chunksize: int, columns=None):
+    for chunk in iter_chunks(path, chunksize, columns=columns):
+        yield ordenar_temporalmente(chunk)
+
+def _juntar_momentos(a, b):
+    """Combina (n, média, M2) de dois blocos (Chan et al.)."""
+    n = a[0] + b[0]
+    if n == 0:
+        return a
+    d = b[1] - a[1]
+    mean = a[1] + d * b[0] / n
+    m2 = a[2] + b[2] + d * d * a[0] * b[0] / n
+    return (n, mean, m2)
+
+def _estatisticas_blocos(path: Path, chunksize: int) -> dict:
+    import pyarrow as pa
+    st = {"n": 0, "p": 0, "num": None, "cols": None, "schema": None}
+    for chunk in _ler_blocos(path, chunksize):
+        # esquema Parquet comum a todos os blocos (ex.: coluna só com nulos no 1.º bloco)
+        sch = pa.Schema.from_pandas(chunk, preserve_index=False).remove_metadata()
+        st["schema"] = sch if st["schema"] is None else pa.unify_schemas(
+            [st["schema"], sch], promote_options="permissive")
+        if st["num"] is None:
+            st["cols"] = list(chunk.columns)
+            st["p"] = chunk.shape[1]
+            st["num"] = {c: {"mom": (0, 0.0, 0.0), "nan": 0, "min": np.inf, "max": -np.inf}
+                         for c in chunk.select_dtypes(include="number").columns}
+        st["n"] += len(chunk)
+        for c, s in st["num"].items():
+            x = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype="float64")
+            x = x[~np.isnan(x)]
+            s["nan"] += len(chunk) - len(x)
+            if len(x):
+                s["mom"] = _juntar_momentos(s["mom"], (len(x), x.mean(), ((x - x.mean()) ** 2).sum()))
+                s["min"] = min(s["min"], x.min())
+                s["max"] = max(s["max"], x.max())
+    return st
+
+def _medianas_exatas(path: Path, chunksize: int, st: dict, cols: list, cap: int) -> dict:
+    """Medianas exatas (iguais a Series.median) sem carregar as colunas inteiras."""
+    alvos = {}
+    for c in cols:
+        n = st["num"][c]["mom"][0]
+        if n == 0:
+            continue
+        lo, hi = st["num"][c]["min"], np.nextafter(st["num"][c]["max"], np.inf)
+        for k in sorted({(n - 1) // 2, n // 2}):
+            alvos[(c, k)] = {"lo": lo, "hi": hi, "valor": None}
+
+    while any(a["valor"] is None for a in alvos.values()):
+        ativos = {t: a for t, a in alvos.items() if a["valor"] is None}
+        for a in ativos.values():
+            a["edges"] = np.linspace(a["lo"], a["hi"], _BINS + 1)
+            a["hist"] = np.zeros(_BINS, dtype="int64")
+            a["below"] = 0
+        usecols = sorted({c for c, _ in ativos})
+        for chunk in _ler_blocos(path, chunksize, columns=usecols):
+            for (c, _), a in ativos.items():
+                x = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype="float64")
+                x = x[~np.isnan(x)]
+                a["below"] += int((x < a["lo"]).sum())
+                x = x[(x >= a["lo"]) & (x < a["hi"])]
+                idx = np.searchsorted(a["edges"], x, side="right") - 1
+                a["hist"] += np.bincount(np.clip(idx, 0, _BINS - 1), minlength=_BINS)
+
+        recolher = {}
+        for (c, k), a in ativos.items():
+            cum = a["below"] + np.cumsum(a["hist"])
+            b = int(np.searchsorted(cum, k + 1))
+            lo, hi = a["edges"][b], a["edges"][b + 1]
+            a["rank"] = k - (cum[b] - a["hist"][b])
+            if np.nextafter(lo, np.inf) >= hi:          # classe já não é divisível
+                a["valor"] = lo
+            elif a["hist"][b] <= cap:
+                recolher[(c, k)] = (lo, hi)
+            else:
+                a["lo"], a["hi"] = lo, hi
+
+        if recolher:
+            vals = {t: [] for t in recolher}
+            usecols = sorted({c for c, _ in recolher})
+            for chunk in _ler_blocos(path, chunksize, columns=usecols):
+                for (c, k), (lo, hi) in recolher.items():
+                    x = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype="float64")
+                    vals[(c, k)].append(x[(x >= lo) & (x < hi)])
+            for t, parts in vals.items():
+                v = np.concatenate(parts)
+                r = int(alvos[t]["rank"])
+                alvos[t]["valor"] = np.partition(v, r)[r]
+
+    med = {}
+    for c in cols:
+        ks = [alvos[t]["valor"] for t in alvos if t[0] == c]
+        if ks:
+            med[c] = float(np.mean(ks))
+    return med
+
+def _fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Hash de 64 bits por linha; números normalizados para float (1 == 1.0, como em duplicated)."""
+    norm = df.copy()
+    for c in norm.select_dtypes(include="number").columns:
+        norm[c] = norm[c].astype("float64")
+    return pd.util.hash_pandas_object(norm, index=False).to_numpy()
+
+class _ImpressoesVistas:
+    """Conjunto de impressões digitais em runs ordenados e disjuntos, de tamanhos geométricos."""
+    def __init__(self):
+        self.runs = []
+
+    def contem(self, h: np.ndarray) -> np.ndarray:
+        vistas = np.zeros(len(h), dtype=bool)
+        for r in self.runs:
+            vistas |= r[np.searchsorted(r, h).clip(max=len(r) - 1)] == h
+        return vistas
+
+    def juntar(self, h: np.ndarray):
+        """Acrescenta impressões novas (não vistas e sem repetições)."""
+        run = np.sort(h)
+        while self.runs and len(self.runs[-1]) <= len(run):
+            # timsort (kind="stable") funde dois runs ordenados em tempo linear
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind="stable")
+        self.runs.append(run)
+
+def _normalizador():
+    if MASTER is None:
+        return None
+    return NormalizadorClientes(ler_lista_mestre(MASTER), limiar=LIMIAR_NOMES)
+
+def _juntar_correcoes(partes: list) -> pd.DataFrame:
+    if not partes:
+        return pd.DataFrame(columns=["bruto", "canonico", "linhas"])
+    return (pd.concat(partes).groupby(["bruto", "canonico"], as_index=False)["linhas"].sum()
+              .sort_values("linhas", ascending=False, ignore_index=True))
+
+def _limiar_z_global(regras: list, modo: str) -> float:
+    if len(regras) != 1 or regras[0]["regra"] != "z" or regras[0].get("grupos"):
+        raise ValueError(f"❌ O modo {modo} só suporta uma regra z global (--outliers=z[:limiar]).")
+    return regras[0].get("limiar", 3.0)
+
+def _parametros_z(num: dict, med: dict, regras: list):
+    """Média/desvio globais do z-score (ddof=0) já com os valores imputados."""
+    zpar, z_invalido = {}, False
+    z_cols = regras[0].get("colunas") or list(num)
+    for c, s in num.items():
+        if c not in z_cols:
+            continue
+        mom, nan = s["mom"], s["nan"]
+        if nan and c in med:
+            mom, nan = _juntar_momentos(mom, (nan, med[c], 0.0)), 0
+        std = np.sqrt(mom[2] / mom[0]) if mom[0] else 0.0
+        if nan or std == 0:           # zscore devolveria NaN -> nenhuma linha passa
+            z_invalido = True
+        zpar[c] = (mom[1], std)
+    return zpar, z_invalido
+
+def _limpar_bloco(chunk, med, zpar, z_invalido, limiar, corr_counts, norm, partes_nomes):
+    """Imputação, filtro z com parâmetros globais e correção de clientes de um bloco."""
+    for c, v in med.items():
+        chunk[c] = chunk[c].fillna(v)
+
+    removed = 0
+    if zpar:
+        if z_invalido:
+            mask_ok = np.zeros(len(chunk), dtype=bool)
+        else:
+            mask_ok = np.ones(len(chunk), dtype=bool)
+            for c, (mu, sd) in zpar.items():
+                x = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype="float64")
+                mask_ok &= np.abs((x - mu) / sd) <= limiar
+        removed = int((~mask_ok).sum())
+        chunk = chunk[mask_ok].copy()
+
+    if corr_counts:
+        for k in CORR:
+            corr_counts[k] += int((chunk["Cliente"] == k).sum())
+        chunk["Cliente"] = chunk["Cliente"].replace(CORR)
+        if norm is not None:
+            cli, corr = norm.aplicar(chunk["Cliente"])
+            chunk["Cliente"] = cli.astype(object)
+            partes_nomes.append(corr)
+    return chunk, removed
+
+def limpar_por_blocos(raw: Path, chunksize: int = CHUNKSIZE, regras: list = REGRAS_OUTLIERS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    limiar = _limiar_z_global(regras, "por blocos")
+    st = _estatisticas_blocos(raw, chunksize)
+    if st["num"] is None:
+        raise ValueError(f"❌ Ficheiro sem linhas: {raw}")
+    imput_cols = [c for c in IMPUT_COLS if c in st["cols"]]
+    imput = {c: st["num"][c]["nan"] if c in st["num"] else 0 for c in imput_cols}
+    med = _medianas_exatas(raw, chunksize, st, [c for c in imput_cols if imput[c]], cap=chunksize)
+    zpar, z_invalido = _parametros_z(st["num"], med, regras)
+
+    removed = dups = final_n = 0
+    corr_counts = {k: 0 for k in CORR} if "Cliente" in st["cols"] else {}
+    norm = _normalizador() if corr_counts else None
+    partes_nomes = []
+    vistas = _ImpressoesVistas()
+    writer, schema = None, st["schema"]
+    try:
+        for chunk in _ler_blocos(raw, chunksize):
+            chunk, r = _limpar_bloco(chunk, med, zpar, z_invalido, limiar,
+                                     corr_counts, norm, partes_nomes)
+            removed += r
+
+            h = _fingerprints(chunk)
+            novo = ~pd.Series(h).duplicated().to_numpy() & ~vistas.contem(h)
+            dups += int((~novo).sum())
+            chunk = chunk[novo]
+            vistas.juntar(h[novo])
+
+            if writer is None:
+                writer = pq.ParquetWriter(OUT_PARQUET, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False)
+                                 .replace_schema_metadata().cast(schema))
+            atualizar_vocab(chunk)
+            final_n += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    nomes = (_juntar_correcoes(partes_nomes), len(norm.sem_correspondencia())) if norm else None
+    escrever_resumo(raw, st["n"], st["p"], final_n, st["p"],
+                    imput, removed, dups, corr_counts, OUT_PARQUET, regras, [removed], nomes)
+
+# =========================
+# Modo incremental (partições Ano/Mês)
+# =========================
+# O armazenamento limpo fica em data/processed/particoes/AAAA-MM.parquet e o
+# _manifest.json guarda, por partição, o hash do conteúdo bruto e agregados
+# combináveis (n/média/M2, omissos e um esboço de quantis por histograma
+# logarítmico). As estatísticas globais (mediana para imputação, média/desvio
+# para o z) resultam da fusão dos agregados de TODAS as partições, sem as
+# recalcular a partir das linhas. Cada partição guarda também a assinatura dos
+# parâmetros com que foi limpa: num refresh são limpas as partições novas ou
+# alteradas e as que foram limpas com parâmetros diferentes dos atuais, pelo que
+# o resultado não depende da ordem de chegada. Partições que desapareceram do
+# ficheiro bruto são apagadas. A mediana vem do esboço (erro relativo < 0,6%).
+# O manifesto guarda ainda o hash do ficheiro bruto: se não mudou, nem é relido
+# (as partições e os agregados continuam válidos). Se mudou, é lido por inteiro
+# (um xlsx não se lê por intervalos de linhas), mas só as partições alteradas são
+# limpas e escritas.
+_SK_POR_DECADA = 400
+
+def _esboco(x: np.ndarray) -> dict:
+    """Histograma logarítmico com sinal: chave 's:k' -> contagem (combinável por soma)."""
+    x = x[~np.isnan(x)]
+    sinal = np.sign(x).astype(int)
+    k = np.zeros(len(x), dtype=int)
+    nz = x != 0
+    k[nz] = np.floor(np.log10(np.abs(x[nz])) * _SK_POR_DECADA).astype(int)
+    chaves, cont = np.unique(np.stack([sinal, k]), axis=1, return_counts=True)
+    return {f"{s}:{kk}": int(c) for (s, kk), c in zip(chaves.T, cont)}
+
+def _mediana_esboco(esboco: dict) -> float:
+    def valor(chave):
+        s, k = map(int, chave.split(":"))
+        return 0.0 if s == 0 else s * 10 ** ((k + 0.5) / _SK_POR_DECADA)
+    itens = sorted(((valor(c), n) for c, n in esboco.items()))
+    vals = np.array([v for v, _ in itens])
+    cum = np.cumsum([n for _, n in itens])
+    n = cum[-1]
+    lo = vals[np.searchsorted(cum, (n - 1) // 2 + 1)]
+    hi = vals[np.searchsorted(cum, n // 2 + 1)]
+    return float((lo + hi) / 2)
+
+def _agregados_particao(part: pd.DataFrame) -> dict:
+    num = {}
+    for c in part.select_dtypes(include="number").columns:
+        x = part[c].to_numpy(dtype="float64")
+        v = x[~np.isnan(x)]
+        num[c] = {"mom": [len(v), float(v.mean()) if len(v) else 0.0,
+                          float(((v - v.mean()) ** 2).sum()) if len(v) else 0.0],
+                  "nan": int(len(x) - len(v))}
+        if c in IMPUT_COLS:
+            num[c]["sk"] = _esboco(v)
+    return num
+
+def _juntar_agregados(manifest: dict) -> dict:
+    num = {}
+    for info in manifest.values():
+        for c, a in info["num"].items():
+            g = num.setdefault(c, {"mom": (0, 0.0, 0.0), "nan": 0, "sk": {}})
+            g["mom"] = _juntar_momentos(g["mom"], tuple(a["mom"]))
+            g["nan"] += a["nan"]
+            for k, n in a.get("sk", {}).items():
+                g["sk"][k] = g["sk"].get(k, 0) + n
+    return num
+
+def _assinatura_parametros(med: dict, zpar: dict, z_invalido: bool, limiar: float) -> str:
+    """Hash dos parâmetros que determinam o resultado da limpeza de uma partição."""
+    par = {"med": med, "z": {c: list(v) for c, v in zpar.items()}, "z_invalido": z_invalido,
+           "limiar": limiar, "clientes_master": str(MASTER) if MASTER else None,
+           "limiar_nomes": LIMIAR_NOMES}
+    return hashlib.sha256(json.dumps(par, sort_keys=True, default=float).encode()).hexdigest()[:16]
+
+def _particoes(df: pd.DataFrame) -> tuple:
+    """({"AAAA-MM": linhas da partição}, n.º de linhas sem Ano/Mês) do ficheiro bruto ordenado."""
+    if not {"Ano", "Mês"}.issubset(df.columns):
+        raise ValueError("❌ O modo incremental precisa das colunas 'Ano' e 'Mês'.")
+    sem_periodo = int(df[["Ano", "Mês"]].isna().any(axis=1).sum())
+    partes = {f"{int(ano):04d}-{int(mes):02d}": part
+              for (ano, mes), part in df.groupby(["Ano", "Mês"], sort=True)}
+    return partes, sem_periodo
+
+def limpar_incremental(raw: Path, regras: list = REGRAS_OUTLIERS):
+    limiar = _limiar_z_global(regras, "incremental")
+    PART_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = json.loads(MANIFEST.read_text(encoding="utf-8")) if MANIFEST.exists() else {}
+    fonte = manifest.pop("_fonte", {})
+    h_fonte = file_hash(raw)
+
+    # ficheiro bruto igual ao da última execução: partições e agregados do manifesto
+    # continuam válidos, não é preciso reler nem voltar a calcular os hashes
+    inalterado = (bool(manifest) and fonte.get("hash") == h_fonte
+                  and all((PART_DIR / f"{c}.parquet").exists() for c in manifest))
+    orfas, alteradas = [], set()
+    if inalterado:
+        partes, cols, sem_periodo = None, fonte["colunas"], fonte["sem_periodo"]
+    else:
+        df = ordenar_temporalmente(read_table(raw))
+        partes, sem_periodo = _particoes(df)
+        cols = [str(c) for c in df.columns]
+        orfas = sorted(set(manifest) - set(partes))
+        for chave in orfas:                   # partições que já não existem no ficheiro bruto
+            (PART_DIR / f"{chave}.parquet").unlink(missing_ok=True)
+            del manifest[chave]
+        for f in PART_DIR.glob("*.parquet"):  # restos sem entrada no manifesto
+            if f.stem not in partes:
+                f.unlink()
+        for chave, part in partes.items():
+            h = hashlib.sha256(np.sort(_fingerprints(part)).tobytes()).hexdigest()
+            if manifest.get(chave, {}).get("hash") == h and (PART_DIR / f"{chave}.parquet").exists():
+                continue
+            manifest[chave] = {"hash": h, "linhas": len(part), "num": _agregados_particao(part)}
+            alteradas.add(chave)
+
+    glob = _juntar_agregados(manifest)
+    med = {c: _mediana_esboco(glob[c]["sk"]) for c in IMPUT_COLS
+           if c in glob and glob[c]["nan"] and glob[c]["sk"]}
+    zpar, z_invalido = _parametros_z({c: g for c, g in glob.items() if c in cols}, med, regras)
+    assinatura = _assinatura_parametros(med, zpar, z_invalido, limiar)
+    relimpas = [c for c in manifest if c not in alteradas and manifest[c].get("parametros") != assinatura]
+    a_limpar = sorted(alteradas | set(relimpas))
+    leitura = "lido" if not inalterado else "inalterado (não relido)"
+    if a_limpar and partes is None:           # só os parâmetros mudaram: reler as linhas brutas
+        partes, _ = _particoes(ordenar_temporalmente(read_table(raw)))
+        leitura = "inalterado (relido para re-limpar)"
+
+    imput = {c: 0 for c in IMPUT_COLS if c in cols}
+    removed = dups = final_n = orig_n = 0
+    corr_counts = {k: 0 for k in CORR} if "Cliente" in cols else {}
+    norm = _normalizador() if corr_counts else None
+    partes_nomes = []
+    for chave in a_limpar:
+        part = partes[chave].copy()
+        orig_n += len(part)
+        for c in imput:
+            imput[c] += int(part[c].isna().sum())
+        part, r = _limpar_bloco(part, med, zpar, z_invalido, limiar, corr_counts, norm, partes_nomes)
+        removed += r
+        d = part.duplicated()                 # Ano/Mês fazem parte da linha: não há duplicados entre partições
+        dups += int(d.sum())
+        part = part[~d]
+        part.to_parquet(PART_DIR / f"{chave}.parquet", index=False)
+        atualizar_vocab(part)
+        manifest[chave]["limpas"] = len(part)
+        manifest[chave]["parametros"] = assinatura
+        final_n += len(part)
+
+    tmp = MANIFEST.with_suffix(".tmp")
+    fonte = {"hash": h_fonte, "colunas": cols, "sem_periodo": sem_periodo}
+    tmp.write_text(json.dumps({"_fonte": fonte, **manifest}, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(MANIFEST)
+
+    extra = [
+        f"— Ficheiro bruto {leitura}; "
+        f"partições (Ano/Mês): {len(alteradas)} novas/alteradas, {len(relimpas)} re-limpas "
+        f"(parâmetros globais mudaram), {len(manifest) - len(a_limpar)} inalteradas, "
+        f"{len(orfas)} removidas (total {len(manifest)})",
+    ]
+    if a_limpar:
+        extra.append("  • " + ", ".join(a_limpar[:24]) + (" …" if len(a_limpar) > 24 else ""))
+    if sem_periodo:
+        extra.append(f"  • {sem_periodo} linhas sem Ano/Mês ignoradas")
+    nomes = (_juntar_correcoes(partes_nomes), len(norm.sem_correspondencia())) if norm else None
+    escrever_resumo(raw, orig_n, len(cols), final_n, len(cols), imput, removed, dups,
+                    corr_counts, PART_DIR, regras, [removed], nomes, extra)
+
+@instrumentar("clean_data")
+def main():
+    if not RAW.exists():
+        raise FileNotFoundError(f"❌ Não encontrei o ficheiro de origem: {RAW}")
+
+    if CHUNKED:
+        with etapa("limpar_por_blocos"):
+            limpar_por_blocos(RAW, CHUNKSIZE)
+        return
+    if INCREMENTAL:
+        with etapa("limpar_incremental"):
+            limpar_incremental(RAW)
+        return
+
+    with etapa("ler"):
+        df = read_table(RAW)
+    orig_n, orig_p = df.shape
+
+    # 1) Ordenação temporal
+    with etapa("ordenar"):
+        df = ordenar_temporalmente(df)
+
+    # 2) Imputação de omissos (mediana) em Vendas e Margem_%
+    imput = {}
+    with etapa("imputar"):
+        for c in IMPUT_COLS:
+            if c in df.columns:
+                n_before = int(df[c].isna().sum())
+                if n_before:
+                    df[c] = df[c].fillna(df[c].median())
+                imput[c] = n_before
+
+    # 3) Remoção de outliers (por omissão |z|>3 em QUALQUER coluna numérica;
+    #    regras/colunas/grupos configuráveis — ver outliers.py)
+    with etapa("outliers"):
+        mask_ok, por_regra = mascara_outliers(df, REGRAS_OUTLIERS)
+        removed = int((~mask_ok).sum())
+        df = df[mask_ok].copy()
+
+    # 4) Correções de ortografia em 'Cliente'
+    corr_counts = {}
+    nomes = None
+    with etapa("clientes"):
+        if "Cliente" in df.columns:
+            for k, v in CORR.items():
+                corr_counts[k] = int((df["Cliente"] == k).sum())
+            df["Cliente"] = df["Cliente"].replace(CORR)
+
+        # 4b) Normalização aproximada contra a lista mestre (se indicada)
+        norm = _normalizador() if "Cliente" in df.columns else None
+        if norm is not None:
+            df["Cliente"], correcoes = norm.aplicar(df["Cliente"])
+            nomes = (correcoes, len(norm.sem_correspondencia()))
+
+    # 5) Duplicados
+    with etapa("duplicados"):
+        dups = int(df.duplicated().sum())
+        if dups:
+            df = df.drop_duplicates()
+
+    # 6) Guardar e escrever resumo
+    with etapa("gravar"):
+        df.to_excel(OUT_XLSX, index=False)
+        atualizar_vocab(df)               # categorias novas ficam com códigos estáveis
+    escrever_resumo(RAW, orig_n, orig_p, len(df), df.shape[1],
+                    imput, removed, dups, corr_counts, OUT_XLSX, REGRAS_OUTLIERS, por_regra, nomes)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+from pathlib import Path
+import hashlib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+
+from data_access import caminho_temporario, read_table, CACHE_DIR
+
+# =========================
+# Normalização aproximada de nomes de clientes
+# =========================
+# 1) índice de trigramas de caracteres (sem acentos, minúsculas) sobre a lista mestre;
+# 2) cada nome DISTINTO é resolvido uma única vez: correspondência exata da chave
+#    normalizada ou, se não houver, o canónico com maior coeficiente de Dice
+#    acima do limiar. Os candidatos vêm só dos trigramas "raros" (produto esparso
+#    em lotes); os trigramas muito frequentes ("pad", "ari", ...) entram apenas no
+#    cálculo exato do Dice, como bits, para não gerar pares quase densos;
+# 3) o mapeamento fica em cache no disco (data/cache) e é aplicado às linhas
+#    através dos códigos de uma categórica — nunca linha a linha.
+LIMIAR_PADRAO = 0.75
+LOTE = 512
+_BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)  # popcount
+
+def _chave(nomes) -> pd.Series:
+    s = pd.Series(nomes, dtype=object).astype(str)
+    s = s.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    return s.str.lower().str.replace(r"[^0-9a-z]+", " ", regex=True).str.strip()
+
+def ler_lista_mestre(path: Path, coluna: str = "Cliente") -> list:
+    df = read_table(path)
+    col = coluna if coluna in df.columns else df.columns[0]
+    return sorted(df[col].dropna().astype(str).str.strip().unique())
+
+class NormalizadorClientes:
+    def __init__(self, canonicos: list, limiar: float = LIMIAR_PADRAO, cache_dir: Path = CACHE_DIR):
+        self.canonicos = np.array(sorted(set(canonicos)), dtype=object)
+        self.limiar = limiar
+        chaves = _chave(self.canonicos)
+        self._exato = dict(zip(chaves, self.canonicos))
+        self._vec = CountVectorizer(analyzer="char_wb", ngram_range=(3, 3), binary=True,
+                                    lowercase=False, dtype=np.float32)
+        M = self._vec.fit_transform(chaves).tocsc()                  # canónicos × n-gramas
+        df = np.diff(M.indptr)
+        self._comum = df > max(100, int(0.005 * len(self.canonicos)))
+        self._C = M[:, ~self._comum].T.tocsr()                        # n-gramas raros × canónicos
+        self._C_bits = np.packbits(M[:, self._comum].toarray().astype(bool), axis=1)
+        self._nc = np.asarray(M.sum(axis=1)).ravel()
+        h = hashlib.sha256(("\n".join(self.canonicos) + f"|{limiar}").encode()).hexdigest()[:16]
+        self.cache_file = Path(cache_dir) / f"clientes_map__{h}.parquet"
+        self.mapa = self._ler_cache()
+        self.vistos = set()                  # nomes brutos passados a aplicar() nesta execução
+
+    def _ler_cache(self) -> dict:
+        if self.cache_file.exists():
+            m = pd.read_parquet(self.cache_file)
+            return dict(zip(m["bruto"], zip(m["canonico"], m["score"])))
+        return {}
+
+    def _gravar_cache(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        m = pd.DataFrame([(k, v[0], v[1]) for k, v in self.mapa.items()],
+                         columns=["bruto", "canonico", "score"])
+        tmp = caminho_temporario(self.cache_file)     # leitores concorrentes nunca veem meio ficheiro
+        try:
+            m.to_parquet(tmp, index=False)
+            tmp.replace(self.cache_file)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _resolver_aproximado(self, nomes: np.ndarray, chaves: pd.Series):
+        Q = self._vec.transform(chaves).tocsc()
+        nq = np.asarray(Q.sum(axis=1)).ravel()
+        Q_raro = Q[:, ~self._comum].tocsr()
+        Q_bits = np.packbits(Q[:, self._comum].toarray().astype(bool), axis=1)
+        q_comum = nq - np.asarray(Q_raro.sum(axis=1)).ravel()
+        for ini in range(0, len(nomes), LOTE):
+            S = (Q_raro[ini:ini + LOTE] @ self._C).tocoo()              # interseções (raras) por par
+            i, j = S.row, S.col
+            gi = ini + i
+            # limite superior do Dice: descarta pares que nunca chegariam ao limiar
+            ok = 2 * (S.data + q_comum[gi]) >= self.limiar * (nq[gi] + self._nc[j])
+            i, j, gi, inter = i[ok], j[ok], gi[ok], S.data[ok]
+            inter = inter + _BITS_POR_BYTE[Q_bits[gi] & self._C_bits[j]].sum(axis=1)
+            dice = 2 * inter / (nq[gi] + self._nc[j])
+            # melhor canónico por nome: ordenar por (nome, -dice) e ficar com o 1.º de cada nome
+            ordem = np.lexsort((-dice, i))
+            primeiros = ordem[np.r_[True, np.diff(i[ordem]) != 0]] if len(ordem) else ordem
+            n_lote = min(LOTE, len(nomes) - ini)
+            score = np.zeros(n_lote)
+            canon = np.full(n_lote, None, dtype=object)
+            score[i[primeiros]] = dice[primeiros]
+            canon[i[primeiros]] = self.canonicos[j[primeiros]]
+            canon[score < self.limiar] = None
+            self.mapa.update(zip(nomes[ini:ini + n_lote], zip(canon, score.tolist())))
+
+    def resolver(self, nomes) -> dict:
+        """Resolve (e guarda em cache) os nomes distintos ainda desconhecidos."""
+        novos = np.array([n for n in pd.unique(np.asarray(nomes, dtype=object))
+                          if isinstance(n, str) and n not in self.mapa], dtype=object)
+        if len(novos):
+            chaves = _chave(novos)
+            exatos = chaves.map(self._exato)
+            for n, c in zip(novos[exatos.notna().to_numpy()], exatos.dropna()):
+                self.mapa[n] = (c, 1.0)
+            resto = exatos.isna().to_numpy()
+            if resto.any():
+                self._resolver_aproximado(novos[resto], chaves[resto])
+            self._gravar_cache()
+        return self.mapa
+
+    def aplicar(self, s: pd.Series):
+        """
+        Devolve (serie_normalizada, correcoes), onde correcoes é um DataFrame
+        bruto → canónico com o nº de linhas alteradas. Nomes sem correspondência
+        acima do limiar ficam como estão.
+        """
+        cat = s.astype("category")
+        brutos = np.asarray(cat.cat.categories, dtype=object)
+        self.resolver(brutos)
+        self.vistos.update(brutos)
+        destino = np.array([self.mapa.get(b, (None, 0))[0] or b for b in brutos], dtype=object)
+        novas, codigos_destino = np.unique(destino, return_inverse=True)
+        codes = cat.cat.codes.to_numpy()
+        novos_codes = np.where(codes >= 0, codigos_destino[codes], -1)
+        out = pd.Series(pd.Categorical.from_codes(novos_codes, categories=novas), index=s.index, name=s.name)
+
+        mudou = destino != brutos
+        contagens = np.bincount(codes[codes >= 0], minlength=len(brutos))
+        correcoes = pd.DataFrame({"bruto": brutos[mudou], "canonico": destino[mudou],
+                                  "linhas": contagens[mudou]})
+        correcoes = correcoes.sort_values("linhas", ascending=False, ignore_index=True)
+        return out, correcoes
+
+    def sem_correspondencia(self) -> list:
+        """Nomes vistos nesta execução sem canónico acima do limiar (não toda a cache)."""
+        return sorted(k for k in self.vistos if self.mapa.get(k, (None, 0))[0] is None)
@@ -0,0 +1,76 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from data_access import DATA_CLEAN, load_sales, monetarias_float32, periodo_para_data
+
+# =========================
+# Dados do dashboard (sem Dash): leitura e agregações
+# =========================
+# Separado de app_dash.py para poder ser importado (ex.: benchmark.py) sem
+# arrancar a aplicação. Todas as funções devolvem DataFrames prontos a desenhar.
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Devolve o DF com os nomes de colunas em minúsculas (sem espaços laterais)."""
+    df = df.copy()
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    return df
+
+def load_clean_data(path: Path = DATA_CLEAN, verbose: bool = True) -> pd.DataFrame:
+    # frame compacto partilhado (categóricas + inteiros/float32); erros -> df com 'info'
+    if not Path(path).exists():
+        return pd.DataFrame({"info": [f"ficheiro não encontrado: {path}"]})
+    try:
+        df = monetarias_float32(load_sales(path, verbose=verbose))
+    except Exception as e:
+        return pd.DataFrame({"info": [f"erro a ler '{Path(path).name}': {e}"]})
+    df = normalize_columns(df)
+    # garantir colunas mínimas
+    needed = ["ano","mês","cliente","vendas","produto","canal","margem_%","margem_valor"]
+    for c in needed:
+        if c not in df.columns:
+            df[c] = pd.Series(dtype="float64") if c in ["vendas","margem_%","margem_valor"] else pd.Series(dtype="object")
+    return preparar_datas(df)
+
+def preparar_datas(df: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta a coluna 'data' (1.º dia do mês) a partir do índice de períodos ou de Ano/Mês."""
+    if "info" in df.columns:
+        return df
+    if "periodos" in df.attrs:            # índice = chave de período (Ano*12+Mês), já ordenado
+        df["data"] = periodo_para_data(df.index)
+    elif {"ano","mês"}.issubset(df.columns):
+        df["data"] = pd.to_datetime(
+            df["ano"].astype("Int64").astype(str) + "-" +
+            df["mês"].astype("Int64").astype(str) + "-01",
+            errors="coerce"
+        )
+    else:
+        poss = [c for c in df.columns if "data" in c or "date" in c]
+        df["data"] = pd.to_datetime(df[poss[0]], errors="coerce") if poss else pd.NaT
+    return df
+
+def vendas_mensais(df: pd.DataFrame) -> pd.DataFrame:
+    """Vendas por mês ('data', 'vendas', 'mm3' = média móvel de 3 meses)."""
+    if "periodos" in df.attrs:
+        # soma por período com reduceat sobre os inícios de cada mês (sem groupby/sort)
+        per = df.attrs["periodos"]
+        vendas = np.nan_to_num(df["vendas"].to_numpy(dtype="float64"))
+        out = pd.DataFrame({
+            "data": periodo_para_data(per["chave"]),
+            "vendas": np.add.reduceat(vendas, per["inicio"][:-1]),
+        })
+    else:
+        out = (df[["data","vendas"]]
+                 .dropna()
+                 .groupby("data", as_index=False)["vendas"].sum()
+                 .sort_values("data"))
+    out["mm3"] = out["vendas"].rolling(window=3).mean()
+    return out
+
+def top_clientes(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    return (df.groupby("cliente", as_index=False, observed=True)["vendas"]
+              .sum().sort_values("vendas", ascending=False).head(n))
+
+def top_produtos(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    return (df.groupby("produto", as_index=False, observed=True)["margem_valor"]
+              .sum().sort_values("margem_valor", ascending=False).head(n))
@@ -0,0 +1,334 @@
+from pathlib import Path
+import hashlib
+import os
+import re
+import uuid
+import numpy as np
+import pandas as pd
+
+# =========================
+# Cache colunar (Parquet) à frente do pd.read_excel
+# =========================
+# Cada folha de Excel é convertida UMA vez para Parquet (tipos preservados) e
+# guardada em data/cache/ com o hash do conteúdo no nome do ficheiro:
+#   <nome>-<sha1(caminho)[:8]>__<folha>__<sha256[:16]>.parquet
+# (o hash do caminho absoluto distingue ficheiros com o mesmo nome em pastas diferentes)
+# Se o ficheiro de origem mudar, o hash muda -> nova entrada (a antiga é apagada).
+# O tamanho total da cache é limitado (LRU pela data do último acesso).
+ROOT = Path(".").resolve()
+CACHE_DIR = Path(os.getenv("BIAGIO_CACHE_DIR", ROOT / "data" / "cache"))
+CACHE_MAX_BYTES = int(os.getenv("BIAGIO_CACHE_MAX_MB", "512")) * 1024 * 1024
+CACHE_ENABLED = os.getenv("BIAGIO_CACHE", "1") != "0"
+
+_BLOCK = 1024 * 1024
+
+def file_hash(path: Path) -> str:
+    """SHA-256 do conteúdo do ficheiro (lido em blocos de 1 MB)."""
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _slug(x) -> str:
+    return re.sub(r"[^0-9A-Za-z_-]+", "-", str(x)).strip("-") or "x"
+
+def _path_tag(path: Path) -> str:
+    """Nome do ficheiro + hash curto do caminho absoluto (chave estável por ficheiro)."""
+    resolved = str(Path(path).resolve())
+    return f"{_slug(Path(path).stem)}-{hashlib.sha1(resolved.encode()).hexdigest()[:8]}"
+
+def _cache_prefix(path: Path, sheet_name) -> str:
+    return f"{_path_tag(path)}__{_slug(sheet_name)}__"
+
+def cache_path(path: Path, sheet_name=0, digest: str | None = None) -> Path:
+    """Caminho da entrada de cache para (ficheiro, folha)."""
+    digest = digest or file_hash(path)
+    return CACHE_DIR / f"{_cache_prefix(path, sheet_name)}{digest[:16]}.parquet"
+
+def caminho_temporario(out: Path) -> Path:
+    """Ficheiro temporário único ao lado de `out` (processos concorrentes não se atropelam)."""
+    return out.with_name(f"{out.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+
+def _evict(max_bytes: int = CACHE_MAX_BYTES, keep: Path | None = None):
+    """Apaga as entradas menos recentemente usadas até caber em max_bytes."""
+    entries = sorted(CACHE_DIR.glob("*.parquet"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in entries)
+    for p in entries:
+        if total <= max_bytes:
+            break
+        if keep is not None and p == keep:
+            continue
+        total -= p.stat().st_size
+        p.unlink(missing_ok=True)
+
+def _normalizar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """Nomes de colunas em string; colunas 'object' mistas (ex.: números e texto) passam a string."""
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for c in df.columns:
+        if df[c].dtype == object:
+            kinds = set(map(type, df[c].dropna()))
+            if len(kinds) > 1:
+                df[c] = df[c].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+def _to_parquet_safe(df: pd.DataFrame, out: Path):
+    """Escreve Parquet (o frame já deve vir de _normalizar_tipos)."""
+    tmp = caminho_temporario(out)
+    try:
+        df.to_parquet(tmp, index=False)
+        tmp.replace(out)                  # escrita atómica
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def read_table(path: Path, sheet_name=0, columns=None) -> pd.DataFrame:
+    """
+    Lê uma tabela (xlsx/xls, csv, parquet ou diretório de partições) e devolve um DataFrame.
+    Para Excel usa a cache Parquet: só o primeiro acesso (ou após alteração do
+    ficheiro) paga o custo do openpyxl.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".parquet" or path.is_dir():      # diretório = conjunto de partições Parquet
+        return pd.read_parquet(path, columns=columns)
+    if suffix == ".csv":
+        return pd.read_csv(path, usecols=columns)
+    if not CACHE_ENABLED:
+        df = pd.read_excel(path, sheet_name=sheet_name)
+        return df[columns] if columns is not None else df
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cached = cache_path(path, sheet_name)
+    if cached.exists():
+        os.utime(cached)                  # marca acesso (LRU)
+        return pd.read_parquet(cached, columns=columns)
+
+    # o frame devolvido é o mesmo que fica em cache: 1.ª leitura e seguintes dão os mesmos tipos
+    df = _normalizar_tipos(pd.read_excel(path, sheet_name=sheet_name))
+    # invalidação: remove versões antigas da mesma folha
+    for old in CACHE_DIR.glob(f"{_cache_prefix(path, sheet_name)}*.parquet"):
+        if old != cached:
+            old.unlink(missing_ok=True)
+    try:
+        _to_parquet_safe(df, cached)
+        _evict(keep=cached)
+    except Exception as e:                # a cache nunca deve impedir a leitura
+        print(f"⚠️ Cache não gravada para {path.name}: {e}")
+    return df[columns] if columns is not None else df
+
+def clear_cache():
+    """Remove todas as entradas da cache."""
+    for p in CACHE_DIR.glob("*.parquet"):
+        p.unlink(missing_ok=True)
+
+# =========================
+# Leitura por blocos (modo out-of-core)
+# =========================
+def _iter_excel_rows(path: Path, sheet_name, chunksize: int, columns=None):
+    """Lê um xlsx em streaming (openpyxl read_only) e devolve DataFrames de `chunksize` linhas."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h) for h in next(rows)]
+        buf = []
+        for r in rows:
+            if all(v is None for v in r):     # linhas vazias no fim da folha
+                continue
+            buf.append(r)
+            if len(buf) >= chunksize:
+                df = pd.DataFrame(buf, columns=header).infer_objects()
+                yield df[columns] if columns is not None else df
+                buf = []
+        if buf:
+            df = pd.DataFrame(buf, columns=header).infer_objects()
+            yield df[columns] if columns is not None else df
+    finally:
+        wb.close()
+
+def iter_chunks(path: Path, chunksize: int = 100_000, sheet_name=0, columns=None):
+    """
+    Itera a tabela em blocos de no máximo `chunksize` linhas (memória limitada
+    pelo tamanho do bloco). Excel já convertido é servido pela cache Parquet.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+        return
+    if suffix in (".xlsx", ".xlsm", ".xls"):
+        cached = cache_path(path, sheet_name) if CACHE_ENABLED else None
+        if cached is None or not cached.exists():
+            yield from _iter_excel_rows(path, sheet_name, chunksize, columns)
+            return
+        path = cached
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(path)
+    for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+# =========================
+# Loader tipado do dataset de vendas
+# =========================
+# Cliente/Produto/Canal como categóricas com vocabulário estável (persistido em
+# data/processed/vocabulario.json: categorias novas são acrescentadas no fim,
+# os códigos existentes nunca mudam) e Ano/Mês em inteiros pequenos. As colunas
+# monetárias ficam em float64 (alvo e variáveis dos modelos); o dashboard pode
+# passá-las a float32 com monetarias_float32 quando isso preserva os cêntimos.
+# Só as etapas que produzem dados (clean_data, lag_features) acrescentam ao
+# vocabulário em disco (atualizar_vocab); os leitores juntam as categorias ainda
+# desconhecidas no fim, só em memória.
+CATEGORICAS = ["Cliente", "Produto", "Canal"]
+MONETARIAS = ["Vendas", "Margem_%", "Margem_Valor"]
+VOCAB_PATH = ROOT / "data" / "processed" / "vocabulario.json"
+DATA_CLEAN = ROOT / "data" / "processed" / "dataset_biagio_clean.xlsx"
+
+def _mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def load_vocab(path: Path = VOCAB_PATH) -> dict:
+    import json
+    return json.loads(Path(path).read_text(encoding="utf-8")) if Path(path).exists() else {}
+
+def _categorias(conhecidas: list, valores) -> list:
+    """Vocabulário conhecido + valores ainda desconhecidos (ordenados) no fim."""
+    ja = set(conhecidas)
+    return conhecidas + sorted(v for v in pd.unique(valores) if v not in ja)
+
+def atualizar_vocab(df: pd.DataFrame, path: Path = VOCAB_PATH) -> dict:
+    """Acrescenta ao vocabulário em disco as categorias novas de df (escrita atómica)."""
+    import json
+    vocab = load_vocab(path)
+    mudou = False
+    for c in CATEGORICAS:
+        if c in df.columns:
+            atual = vocab.get(c, [])
+            novo = _categorias(atual, df[c].dropna().astype(str))
+            if len(novo) > len(atual):
+                vocab[c] = novo
+                mudou = True
+    if mudou:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = caminho_temporario(path)
+        try:
+            tmp.write_text(json.dumps(vocab, ensure_ascii=False, indent=1), encoding="utf-8")
+            tmp.replace(path)
+        finally:
+            tmp.unlink(missing_ok=True)
+    return vocab
+
+def monetarias_float32(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas monetárias em float32 quando isso preserva os cêntimos (só para visualização)."""
+    for c in MONETARIAS:
+        if c in df.columns and pd.api.types.is_float_dtype(df[c]):
+            x = df[c].to_numpy(dtype="float64")
+            x32 = x.astype("float32")
+            with np.errstate(invalid="ignore"):
+                seguro = np.all(np.isnan(x) | (np.abs(x32.astype("float64") - x) < 0.005))
+            if seguro:
+                df[c] = x32
+    return df
+
+def compactar(df: pd.DataFrame, vocab_path: Path = VOCAB_PATH, verbose: bool = False) -> pd.DataFrame:
+    """Converte o frame de vendas para a representação compacta (ver acima)."""
+    antes = _mb(df) if verbose else 0.0
+    df = df.copy()
+    vocab = load_vocab(vocab_path)
+    for c in CATEGORICAS:
+        if c in df.columns:
+            valores = df[c].astype(str).where(df[c].notna())
+            df[c] = pd.Categorical(valores, categories=_categorias(vocab.get(c, []), valores.dropna()))
+    for c, tipo in (("Ano", "int16"), ("Mês", "int8")):
+        if c in df.columns and pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = df[c].astype(tipo if df[c].notna().all() else tipo.capitalize())
+    if verbose:
+        print(f"🧮 Memória do dataset: {antes:.2f} MB → {_mb(df):.2f} MB")
+    return df
+
+# =========================
+# Chave de período (Ano*12 + Mês)
+# =========================
+# Calculada uma vez no carregamento: o frame fica ordenado pela chave (que passa
+# a ser o índice "periodo") e df.attrs["periodos"] guarda o índice período →
+# intervalo de linhas: {"chave": períodos únicos ordenados, "inicio": posições
+# de início + [len]}. São listas simples para o pandas as copiar/comparar sem
+# custo e as gravar nos metadados do Parquet junto com os dados.
+# Splits temporais, agregação mensal e filtros de datas passam a ser fatias.
+PERIODO = "periodo"
+_VERSAO_VENDAS = 2                # muda quando a representação em cache muda (v2: monetárias em float64)
+
+def chave_periodo(ano, mes) -> np.ndarray:
+    """Ano*12 + Mês como int32 (meses consecutivos -> inteiros consecutivos)."""
+    return np.asarray(ano, dtype="int32") * 12 + np.asarray(mes, dtype="int32")
+
+def periodo_para_data(periodo) -> np.ndarray:
+    """Converte chaves de período em datetime64 (1.º dia do mês), sem parsing de strings."""
+    meses = np.asarray(periodo, dtype="int64") - (1970 * 12 + 1)
+    return meses.astype("datetime64[M]").astype("datetime64[ns]")
+
+def ordenar_por_periodo(df: pd.DataFrame) -> pd.DataFrame:
+    """Ordena (estável) pela chave de período, usa-a como índice e calcula o índice de fatias."""
+    chave = chave_periodo(df["Ano"], df["Mês"])
+    ordem = np.argsort(chave, kind="stable")
+    df = df.iloc[ordem]
+    df.index = pd.Index(chave[ordem], name=PERIODO)
+    return indexar_periodos(df)
+
+def indexar_periodos(df: pd.DataFrame) -> pd.DataFrame:
+    chave = df.index.to_numpy()
+    inicio = np.flatnonzero(np.r_[True, chave[1:] != chave[:-1]]) if len(chave) else np.empty(0, int)
+    df.attrs["periodos"] = {"chave": chave[inicio].tolist(), "inicio": np.r_[inicio, len(chave)].tolist()}
+    return df
+
+def linhas_periodo(df: pd.DataFrame, p_ini=None, p_fim=None) -> slice:
+    """Intervalo de linhas [p_ini, p_fim] (chaves inclusivas) — pesquisa binária nos períodos."""
+    periodos, inicio = df.attrs["periodos"]["chave"], df.attrs["periodos"]["inicio"]
+    a = 0 if p_ini is None else int(np.searchsorted(periodos, p_ini, side="left"))
+    b = len(periodos) if p_fim is None else int(np.searchsorted(periodos, p_fim, side="right"))
+    return slice(int(inicio[a]), int(inicio[b]))
+
+def load_sales(path: Path = DATA_CLEAN, sheet_name=0, verbose: bool = True) -> pd.DataFrame:
+    """
+    Lê o dataset de vendas na representação compacta, ordenado pela chave de
+    período. O frame ordenado e o índice de períodos ficam em cache (chave = hash
+    do ficheiro), pelo que leituras seguintes não voltam a ordenar nem converter.
+    """
+    path = Path(path)
+    base = None
+    if CACHE_ENABLED and path.is_file():
+        prefixo = f"{_path_tag(path)}__{_slug(sheet_name)}-vendas{_VERSAO_VENDAS}__"
+        base = CACHE_DIR / f"{prefixo}{file_hash(path)[:16]}"
+        if base.with_suffix(".parquet").exists():
+            os.utime(base.with_suffix(".parquet"))
+            df = pd.read_parquet(base.with_suffix(".parquet"))
+            vocab = load_vocab()
+            for c in CATEGORICAS:                # vocabulário só cresce -> códigos mantêm-se
+                if c in df.columns and c in vocab:
+                    cats = _categorias(vocab[c], df[c].cat.categories)
+                    if list(df[c].cat.categories) != cats:
+                        df[c] = df[c].cat.set_categories(cats)
+            if verbose:
+                print(f"🧮 Memória do dataset: {_mb(df):.2f} MB (cache)")
+            return df if "periodos" in df.attrs else indexar_periodos(df)
+
+    df = compactar(read_table(path, sheet_name=sheet_name), verbose=verbose)
+    if {"Ano", "Mês"}.issubset(df.columns) and not df[["Ano", "Mês"]].isna().any().any():
+        df = ordenar_por_periodo(df)
+        if base is not None:
+            try:
+                CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                for old in CACHE_DIR.glob(f"{_path_tag(path)}__{_slug(sheet_name)}-vendas*.parquet"):
+                    if old != base.with_suffix(".parquet"):
+                        old.unlink(missing_ok=True)
+                tmp = caminho_temporario(base.with_suffix(".parquet"))
+                try:
+                    df.to_parquet(tmp)
+                    tmp.replace(base.with_suffix(".parquet"))
+                finally:
+                    tmp.unlink(missing_ok=True)
+            except Exception as e:
+                print(f"⚠️ Cache não gravada para {path.name}: {e}")
+    return df
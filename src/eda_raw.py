@@ -4,6 +4,9 @@ import numpy as np
 import pandas as pd
 import sweetviz as sv
 
+from data_access import read_table
+from instrumentacao import etapa, instrumentar
+
 ROOT = Path(".").resolve()
 DATA = Path(sys.argv[1]) if len(sys.argv) > 1 else ROOT / "data" / "raw" / "dataset_biagio.xlsx"
 
@@ -20,33 +23,36 @@ def z_outliers_count(s: pd.Series, z=3.0) -> int:
         return 0
     return int(((s - m).abs() > z * sd).sum())
 
+@instrumentar("eda_raw")
 def main():
     if not DATA.exists():
         raise FileNotFoundError(f"❌ Não encontrei o dataset original: {DATA}")
-    df = pd.read_excel(DATA)
+    with etapa("ler"):
+        df = read_table(DATA)
     n, p = df.shape
 
-    tipos = df.dtypes.rename("Tipo").to_frame()
-    missing = df.isna().sum().rename("Omissos").to_frame()
-    duplicados = int(df.duplicated().sum())
-    stats = df.describe(include="all").transpose()
+    with etapa("estatisticas"):
+        tipos = df.dtypes.rename("Tipo").to_frame()
+        missing = df.isna().sum().rename("Omissos").to_frame()
+        duplicados = int(df.duplicated().sum())
+        stats = df.describe(include="all").transpose()
 
-    out_counts = pd.Series(
-        {c: z_outliers_count(df[c]) for c in df.select_dtypes(include="number").columns},
-        name="N_outliers(|z|>3)"
-    ).to_frame()
+        out_counts = pd.Series(
+            {c: z_outliers_count(df[c]) for c in df.select_dtypes(include="number").columns},
+            name="N_outliers(|z|>3)"
+        ).to_frame()
 
-    corr = df.corr(numeric_only=True)
+        corr = df.corr(numeric_only=True)
 
-    tops = {}
-    if "Cliente" in df.columns:
-        tops["top_clientes"] = (df["Cliente"].astype(str).value_counts(dropna=False)
-                                .rename_axis("Cliente").rename("freq").reset_index().head(10))
-    if "Produto" in df.columns:
-        tops["top_produtos"] = (df["Produto"].astype(str).value_counts(dropna=False)
-                                .rename_axis("Produto").rename("freq").reset_index().head(10))
+        tops = {}
+        if "Cliente" in df.columns:
+            tops["top_clientes"] = (df["Cliente"].astype(str).value_counts(dropna=False)
+                                    .rename_axis("Cliente").rename("freq").reset_index().head(10))
+        if "Produto" in df.columns:
+            tops["top_produtos"] = (df["Produto"].astype(str).value_counts(dropna=False)
+                                    .rename_axis("Produto").rename("freq").reset_index().head(10))
 
-    with pd.ExcelWriter(XLSX_OUT, engine="openpyxl") as w:
+    with etapa("excel"), pd.ExcelWriter(XLSX_OUT, engine="openpyxl") as w:
         pd.DataFrame({"Fonte":[str(DATA.resolve())],"Linhas":[n],"Colunas":[p]}).to_excel(w,"meta",index=False)
         df.head(20).to_excel(w,"primeiras_20",index=False)
         tipos.to_excel(w,"tipos")
@@ -73,7 +79,8 @@ def main():
     TXT_OUT.write_text("\n".join(resumo), encoding="utf-8")
 
     try:
-        sv.analyze(df).show_html(str(HTML_OUT), open_browser=False)
+        with etapa("sweetviz"):
+            sv.analyze(df).show_html(str(HTML_OUT), open_browser=False)
     except Exception as e:
         with TXT_OUT.open("a", encoding="utf-8") as f:
             f.write(f"\n⚠️ Sweetviz não gerado: {e}\n")
@@ -92,6 +99,8 @@ from pathlib import Path
 import pandas as pd
 import sweetviz as sv
 
+from data_access import read_table
+
 # Caminho para os dados brutos
 DATA = Path("data/raw/dataset_biagio.xlsx")
 XLSX_OUT = Path("reports/eda_raw_outputs.xlsx")
@@ -100,7 +109,7 @@ HTML_OUT = Path("reports/eda_raw_sweetviz.html")
 
 def main():
     # Carregar dataset original
-    df = pd.read_excel(DATA)
+    df = read_table(DATA)
 
     resumo = []
     resumo.append(f"Dimensão: {df.shape[0]} linhas x {df.shape[1]} colunas")
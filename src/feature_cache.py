@@ -0,0 +1,140 @@
+from pathlib import Path
+import hashlib
+import json
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder
+
+from data_access import CACHE_DIR, CACHE_ENABLED, DATA_CLEAN, caminho_temporario, file_hash, load_sales, _path_tag, _slug
+import lag_features
+
+# =========================
+# Feature-matrix cache shared by model_train and feature_importance
+# =========================
+# The fitted ColumnTransformer (numeric passthrough + one-hot) and the encoded
+# design matrix for ALL rows (in load_sales order, i.e. sorted by period) are
+# stored in data/cache under the same path-tagged name as data_access's entries
+# (two files with the same name in different folders never share an entry),
+# keyed by the dataset hash, the column config and the sklearn version. The
+# encoder vocabulary is fitted on the full frame: a category that only appears
+# in the test rows becomes an all-zero column in training, which is what
+# handle_unknown="ignore" would give anyway.
+TARGET = "Vendas"
+
+def build_preprocessor(X: pd.DataFrame) -> ColumnTransformer:
+    """Numeric passthrough + one-hot for the remaining (categorical) columns."""
+    num_cols = X.select_dtypes(include=np.number).columns.tolist()
+    cat_cols = [c for c in X.columns if c not in num_cols]
+    return ColumnTransformer(
+        transformers=[
+            ("num", "passthrough", num_cols),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
+        ],
+        remainder="drop"
+    )
+
+def feature_names(preproc: ColumnTransformer) -> list:
+    """Column names of the encoded matrix ('Ano', ..., 'Cliente_X', ...)."""
+    num_cols, cat_cols = preproc.transformers_[0][2], preproc.transformers_[1][2]
+    names = list(num_cols)
+    if cat_cols:
+        names += preproc.named_transformers_["cat"].get_feature_names_out(cat_cols).tolist()
+    return names
+
+def source_groups(preproc: ColumnTransformer) -> dict:
+    """{original column: positions in the encoded matrix}; a one-hot block maps back to its column."""
+    num_cols, cat_cols = preproc.transformers_[0][2], preproc.transformers_[1][2]
+    groups = {c: [i] for i, c in enumerate(num_cols)}
+    pos = len(num_cols)
+    if cat_cols:
+        for c, cats in zip(cat_cols, preproc.named_transformers_["cat"].categories_):
+            groups[c] = list(range(pos, pos + len(cats)))
+            pos += len(cats)
+    return groups
+
+def _config_key(path: Path, sheet_name, X: pd.DataFrame, target: str, lags: bool = False) -> str:
+    cfg = {"data": file_hash(path), "sheet": str(sheet_name), "target": target,
+           "lags": file_hash(lag_features.OUT) if lags else None,
+           "columns": [(c, str(t)) for c, t in X.dtypes.items()],
+           "sklearn": sklearn.__version__}
+    return hashlib.sha256(json.dumps(cfg, sort_keys=True).encode()).hexdigest()[:16]
+
+def load_design(path: Path = DATA_CLEAN, target: str = TARGET, sheet_name=0, verbose: bool = True,
+                lags: bool = False):
+    """
+    Returns (df, preproc, Xt, names): the compact frame from load_sales, the
+    fitted preprocessor, the encoded matrix for every row of df (sparse or dense,
+    exactly as ColumnTransformer produces it) and the encoded feature names.
+    With lags=True the Cliente×Produto lag/rolling columns from lag_features.py
+    are joined to df first (run src/lag_features.py to build/extend them).
+    """
+    path = Path(path)
+    df = load_sales(path, sheet_name=sheet_name, verbose=verbose)
+    if lags:
+        df = lag_features.juntar(df)
+    X = df.drop(columns=[target])
+
+    out = None
+    if CACHE_ENABLED and path.is_file():
+        prefix = f"features__{_path_tag(path)}__{_slug(sheet_name)}{'-lags' if lags else ''}"
+        out = CACHE_DIR / f"{prefix}__{_config_key(path, sheet_name, X, target, lags)}.joblib"
+        if out.exists():
+            try:
+                blob = joblib.load(out, mmap_mode="r")
+                if blob["Xt"].shape[0] == len(df):
+                    if verbose:
+                        print(f"🧮 Feature matrix {blob['Xt'].shape} loaded from cache")
+                    return df, blob["preproc"], blob["Xt"], blob["names"]
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable feature cache {out.name}: {e}")
+
+    preproc = build_preprocessor(X)
+    Xt = preproc.fit_transform(X)
+    names = feature_names(preproc)
+    if out is not None:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            for old in CACHE_DIR.glob(f"{prefix}__*.joblib"):
+                if old != out:
+                    old.unlink(missing_ok=True)
+            tmp = caminho_temporario(out)
+            try:
+                joblib.dump({"preproc": preproc, "Xt": Xt, "names": names}, tmp)
+                tmp.replace(out)
+            finally:
+                tmp.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"⚠️ Feature cache not written for {path.name}: {e}")
+    return df, preproc, Xt, names
+
+# =========================
+# Design matrix shared with worker processes
+# =========================
+# Process pools memory-map the encoded matrix instead of receiving a pickled copy.
+# A sparse matrix is stored as its CSR arrays (<name>_data/_indices/_indptr.npy),
+# so the files grow with the non-zeros and not with rows × one-hot columns; each
+# worker rebuilds the csr_matrix on top of the mapped arrays.
+def dump_matrix(directory, Xt, name: str = "X"):
+    """Save Xt (CSR or dense) under `directory` for load_matrix."""
+    d = Path(directory)
+    if sparse.issparse(Xt):
+        Xt = sparse.csr_matrix(Xt, dtype=np.float64)
+        for part in ("data", "indices", "indptr"):
+            np.save(d / f"{name}_{part}.npy", getattr(Xt, part))
+        np.save(d / f"{name}_shape.npy", np.array(Xt.shape))
+    else:
+        np.save(d / f"{name}.npy", np.ascontiguousarray(Xt, dtype=np.float64))
+
+def load_matrix(directory, name: str = "X"):
+    """Memory-mapped matrix written by dump_matrix (csr_matrix over the mapped arrays, or ndarray)."""
+    d = Path(directory)
+    if (d / f"{name}.npy").exists():
+        return np.load(d / f"{name}.npy", mmap_mode="r")
+    data, indices, indptr = (np.load(d / f"{name}_{part}.npy", mmap_mode="r")
+                             for part in ("data", "indices", "indptr"))
+    shape = tuple(int(n) for n in np.load(d / f"{name}_shape.npy"))
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
@@ -1,10 +1,19 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import tempfile
+import time
+import joblib
 import numpy as np
 import pandas as pd
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.pipeline import Pipeline
+from scipy import sparse
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+
+from feature_cache import dump_matrix, load_design, load_matrix, source_groups
+from model_store import rf_params
+from instrumentacao import etapa, instrumentar
 
 # Paths
 ROOT = Path(".").resolve()
@@ -13,55 +22,110 @@ OUT_XLSX = ROOT / "reports" / "feature_importance.xlsx"
 OUT_PNG  = ROOT / "reports" / "feature_importance.png"
 
 TARGET = "Vendas"
+TRAIN_FRAC = 0.8        # temporal hold-out, same cut as model_train
 
-def main():
-    # 1) Load cleaned dataset
-    df = pd.read_excel(DATA)
-    assert TARGET in df.columns, f"Target column '{TARGET}' not found. Columns: {list(df.columns)}"
-
-    X = df.drop(columns=[TARGET])
-    y = df[TARGET].astype(float)
-
-    # 2) Separate types
-    num_cols = X.select_dtypes(include=np.number).columns.tolist()
-    cat_cols = [c for c in X.columns if c not in num_cols]
+# CLI: python src/feature_importance.py [--sample=N] [--repeats=5] [--jobs=N]
+FLAGS = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "")
+             for a in sys.argv[1:] if a.startswith("--"))
 
-    # 3) Preprocessing: numeric passthrough, categorical one-hot
-    preproc = ColumnTransformer(
-        transformers=[
-            ("num", "passthrough", num_cols),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
-        ],
-        remainder="drop"
-    )
+def _permute_group(args):
+    """
+    Worker: permute the rows of ONE source column (all its one-hot columns
+    together) in the memory-mapped hold-out matrix and return the R² drops
+    relative to `base` (the unpermuted R², computed once by the parent).
+    """
+    name, cols, work_dir, repeats, seed, base = args
+    d = Path(work_dir)
+    model = joblib.load(d / "model.joblib")
+    X = load_matrix(d)
+    y = np.load(d / "y.npy", mmap_mode="r")
+    rng = np.random.default_rng(seed)
+    cols = np.asarray(cols)
+    t0 = time.perf_counter()
+    drops = []
+    if sparse.issparse(X):
+        # only the group's columns are re-stacked; the other columns are shared by every repeat
+        X = X.tocsc()
+        rest = np.setdiff1d(np.arange(X.shape[1]), cols)
+        order = np.argsort(np.r_[rest, cols])
+        X_rest, X_cols = X[:, rest], X[:, cols].tocsr()
+        for _ in range(repeats):
+            Xp = sparse.hstack([X_rest, X_cols[rng.permutation(X.shape[0])]], format="csc")[:, order]
+            drops.append(base - r2_score(y, model.predict(Xp)))
+    else:
+        Xp = np.array(X)                    # private copy; only `cols` are overwritten
+        for _ in range(repeats):
+            Xp[:, cols] = X[np.ix_(rng.permutation(len(X)), cols)]
+            drops.append(base - r2_score(y, model.predict(Xp)))
+    return name, np.mean(drops), np.std(drops), time.perf_counter() - t0
 
-    # 4) Pipeline: preproc + RandomForest
-    rf = Pipeline(steps=[
-        ("prep", preproc),
-        ("model", RandomForestRegressor(n_estimators=500, random_state=42, n_jobs=-1))
-    ])
+def permutation_importance_by_source(model, X_test, y_test, groups: dict, repeats=5,
+                                     sample=None, jobs=None, seed=42) -> pd.DataFrame:
+    """
+    Permutation importance on the hold-out rows (optionally a random subsample),
+    one task per SOURCE column (Cliente, Produto, Canal, Margem_%, ...) run in a
+    process pool. Importance = mean drop in R² over `repeats` shuffles. A sparse
+    X_test stays sparse (CSR arrays memory-mapped by the workers).
+    """
+    X = X_test if sparse.issparse(X_test) else np.asarray(X_test, dtype=np.float64)
+    y = np.asarray(y_test, dtype=np.float64)
+    if sample and sample < len(y):
+        rows = np.sort(np.random.default_rng(seed).choice(len(y), size=sample, replace=False))
+        X, y = X[rows], y[rows]
+    jobs = max(1, min(len(groups), jobs or os.cpu_count() or 1))
+    model = model.set_params(n_jobs=1)      # the parallelism is across features
+    base = r2_score(y, model.predict(X))
+    with tempfile.TemporaryDirectory(prefix="perm_") as work_dir:
+        joblib.dump(model, Path(work_dir) / "model.joblib")
+        dump_matrix(work_dir, X)
+        np.save(Path(work_dir) / "y.npy", y)
+        tasks = [(name, cols, work_dir, repeats, seed + i, base) for i, (name, cols) in enumerate(groups.items())]
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            res = list(ex.map(_permute_group, tasks))
+    return (pd.DataFrame(res, columns=["feature", "importance", "importance_std", "time_s"])
+              .sort_values("importance", ascending=False, ignore_index=True))
 
-    rf.fit(X, y)
+@instrumentar("feature_importance")
+def main():
+    # 1-3) Cleaned dataset + encoded matrix (numeric passthrough, categorical one-hot),
+    #      shared with model_train through the feature cache
+    with etapa("load_design"):
+        df, preproc, Xt, feature_names = load_design(DATA, TARGET)
+    assert TARGET in df.columns, f"Target column '{TARGET}' not found. Columns: {list(df.columns)}"
+    y = df[TARGET].to_numpy(dtype=float)
+    n_train = int(len(df) * TRAIN_FRAC)
 
-    # 5) Feature names after one-hot
-    if cat_cols:
-        ohe = rf.named_steps["prep"].named_transformers_["cat"]
-        cat_names = ohe.get_feature_names_out(cat_cols)
-    else:
-        cat_names = np.array([])
+    # 4) RandomForest on the training rows (tuned config from tune_rf.py, if run)
+    rf = RandomForestRegressor(**rf_params(500), random_state=42, n_jobs=-1)
+    with etapa("random_forest.fit"):
+        rf.fit(Xt[:n_train], y[:n_train])
 
-    feature_names = num_cols + cat_names.tolist()
-    importances = rf.named_steps["model"].feature_importances_
+    # 5) Permutation importance on the hold-out, per source column
+    groups = source_groups(preproc)
+    t0 = time.perf_counter()
+    with etapa("permutation_importance"):
+        imp_df = permutation_importance_by_source(rf, Xt[n_train:], y[n_train:], groups,
+                                                  repeats=int(FLAGS.get("repeats") or 5),
+                                                  sample=int(FLAGS["sample"]) if FLAGS.get("sample") else None,
+                                                  jobs=int(FLAGS["jobs"]) if FLAGS.get("jobs") else None)
+    total_s = time.perf_counter() - t0
 
-    imp_df = (pd.DataFrame({"feature": feature_names, "importance": importances})
-                .sort_values("importance", ascending=False))
+    # impurity importances: per one-hot column, and summed back to the source column
+    impurity = pd.DataFrame({"feature": feature_names, "importance": rf.feature_importances_})
+    imp_df["impurity"] = imp_df["feature"].map(
+        {g: rf.feature_importances_[cols].sum() for g, cols in groups.items()})
+    impurity = impurity.sort_values("importance", ascending=False)
 
-    # 6) Export Excel
+    # 6) Export Excel (1st sheet = permutation ranking by source column)
     OUT_XLSX.parent.mkdir(parents=True, exist_ok=True)
-    imp_df.to_excel(OUT_XLSX, index=False)
+    with etapa("excel"), pd.ExcelWriter(OUT_XLSX, engine="openpyxl") as writer:
+        imp_df.to_excel(writer, sheet_name="permutation", index=False)
+        impurity.to_excel(writer, sheet_name="impurity_onehot", index=False)
 
-    print("✅ Top most relevant variables:")
-    print(imp_df.head(15))
+    print("✅ Most relevant variables (permutation importance, R² drop on hold-out):")
+    print(imp_df)
+    print(f"\n⏱️ Permutation importance: {total_s:.2f}s for {len(groups)} features "
+          f"× {FLAGS.get('repeats') or 5} repeats on {FLAGS.get('sample') or len(y) - n_train} rows")
     print(f"\n📂 Ranking saved at: {OUT_XLSX}")
 
     # 7) (Optional) PNG plot
@@ -70,15 +134,16 @@ def main():
         topN = 15
         top_imp = imp_df.head(topN).iloc[::-1]  # inverted for horizontal bar top-down
         plt.figure(figsize=(9, 6))
-        plt.barh(top_imp["feature"], top_imp["importance"], color="#4e79a7")
-        plt.title("Feature Importance (Random Forest)")
-        plt.xlabel("importance")
+        plt.barh(top_imp["feature"], top_imp["importance"], xerr=top_imp["importance_std"], color="#4e79a7")
+        plt.title("Feature Importance (Random Forest, permutation on hold-out)")
+        plt.xlabel("R² drop")
         plt.tight_layout()
-        plt.savefig(OUT_PNG, dpi=150)
+        with etapa("plot"):
+            plt.savefig(OUT_PNG, dpi=150)
         plt.close()
         print(f"🖼️ Plot saved at: {OUT_PNG}")
     except Exception as e:
         print("⚠️ Could not generate plot:", e)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,230 @@
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_access import load_sales, PERIODO
+from lag_features import agregar_mensal
+
+# Paths
+ROOT = Path(".").resolve()
+DATA = ROOT / "data" / "processed" / "dataset_biagio_clean.xlsx"
+OUT  = ROOT / "reports" / "forecast_series.xlsx"
+
+# =========================
+# Per-series forecasting (Cliente×Produto) with reconciliation
+# =========================
+# Monthly Vendas per Cliente×Produto are turned into dense series (zeros for
+# months without sales, from each series' first sale onwards) and cut into
+# batches of BATCH series. Each process-pool task fits a whole batch at once:
+# a 4-parameter least-squares model per series (level, trend, yearly sin/cos),
+# solved for all series of the batch with batched normal equations. Series with
+# fewer than MIN_OBS months with sales (or less than a year of history) get a
+# seasonal-level fallback instead: the series' deseasonalized mean over the last
+# LEVEL_WINDOW months (the same window for every series, so the fallbacks add up
+# to the company's recent level) × the company-wide month-of-year index. The
+# index is shrunk towards 1 for months with few observations and floored, so a
+# month with no data never zeroes a forecast. This is a pooled seasonal model,
+# not model_train's Random Forest: that one predicts single sales from row
+# features (Canal, margins) that are unknown for future months.
+# Base forecasts are also fitted per Produto and for the company, and reconciled
+# top-down (company -> Produto -> series), so the reconciled series add up to
+# the company forecast.
+#
+#   python src/forecast_series.py [--horizon=3] [--batch=2000] [--workers=N]
+#                                 [--min-obs=6] [--backtest]
+FLAGS = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "")
+             for a in sys.argv[1:] if a.startswith("--"))
+HORIZON = int(FLAGS.get("horizon") or 3)
+BATCH = int(FLAGS.get("batch") or 2000)
+MIN_OBS = int(FLAGS.get("min-obs") or 6)
+LEVEL_WINDOW = 24          # months behind the fallback level
+INDEX_PRIOR = 2.0          # pseudo-years pulling each month-of-year index towards 1
+INDEX_FLOOR = 0.2
+
+def _design(p0: int, n: int) -> np.ndarray:
+    """[1, trend, sin, cos] for n consecutive periods starting at period key p0."""
+    t = np.arange(n)
+    ang = 2 * np.pi * ((p0 + t - 1) % 12) / 12
+    return np.column_stack([np.ones(n), t / 12.0, np.sin(ang), np.cos(ang)])
+
+def seasonal_index(total: np.ndarray, p0: int) -> np.ndarray:
+    """
+    Company-wide month-of-year index (12 values, mean 1) from the total series,
+    shrunk towards 1 by INDEX_PRIOR pseudo-observations per month and floored at
+    INDEX_FLOOR (months never observed get 1).
+    """
+    m = (p0 + np.arange(len(total)) - 1) % 12
+    mean = float(total.mean()) if len(total) else 0.0
+    if mean <= 0:
+        return np.ones(12)
+    cnt = np.bincount(m, minlength=12)
+    by_month = np.bincount(m, weights=total, minlength=12) / np.maximum(cnt, 1) / mean
+    w = cnt / (cnt + INDEX_PRIOR)
+    idx = w * by_month + (1 - w)
+    idx = np.maximum(idx / idx.mean(), INDEX_FLOOR)
+    return idx / idx.mean()
+
+def fit_dense(Y: np.ndarray, start: np.ndarray, p0: int, horizon: int, min_obs: int, sidx: np.ndarray):
+    """
+    Fit every row of Y (series × periods, zeros before `start`) in one shot.
+    Returns (forecasts series × horizon, mask of series using their own model).
+    """
+    n_s, T = Y.shape
+    X = _design(p0, T + horizon)
+    Xh, Xf = X[:T], X[T:]
+    W = (np.arange(T)[None, :] >= start[:, None]).astype(np.float64)
+    XtWX = np.einsum("nt,ti,tj->nij", W, Xh, Xh) + 1e-6 * np.eye(4)
+    XtWy = np.einsum("nt,ti->ni", W * Y, Xh)
+    beta = np.linalg.solve(XtWX, XtWy[..., None])[..., 0]
+    own = np.clip(beta @ Xf.T, 0, None)
+
+    months = (p0 + np.arange(T + horizon) - 1) % 12
+    hist = W.sum(axis=1)
+    a = max(0, T - LEVEL_WINDOW)               # zeros before a series' first sale count too
+    level = (Y[:, a:] / sidx[months[a:T]]).mean(axis=1)
+    fallback = level[:, None] * sidx[months[T:]][None, :]
+    ok = (((Y > 0) & (W > 0)).sum(axis=1) >= min_obs) & (hist >= 12)
+    return np.where(ok[:, None], own, fallback), ok
+
+def _fit_batch(args):
+    """Worker: one batch of series (dense block) -> forecasts, model mask, seconds."""
+    Y, start, p0, horizon, min_obs, sidx = args
+    t0 = time.perf_counter()
+    F, ok = fit_dense(Y, start, p0, horizon, min_obs, sidx)
+    return F, ok, time.perf_counter() - t0
+
+def _dense(codes: np.ndarray, per: np.ndarray, val: np.ndarray, n: int, p0: int, T: int):
+    Y = np.zeros((n, T))
+    np.add.at(Y, (codes, per - p0), val)
+    start = np.full(n, T, dtype=np.int64)
+    np.minimum.at(start, codes, per - p0)
+    return Y, start
+
+def top_down(base: np.ndarray, group: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """
+    Scale the rows of `base` so that, per group, they add up to target[group]
+    (shares from the base forecasts; equal shares when a group forecasts 0).
+    """
+    tot = np.zeros((target.shape[0], base.shape[1]))
+    np.add.at(tot, group, base)
+    cnt = np.bincount(group, minlength=target.shape[0])[group][:, None]
+    tot = tot[group]
+    share = np.where(tot > 0, base / np.where(tot > 0, tot, 1), 1 / cnt)
+    return share * target[group]
+
+def forecast(agg: pd.DataFrame, horizon=HORIZON, batch=BATCH, workers=None, min_obs=MIN_OBS):
+    """
+    agg: monthly Vendas per Cliente×Produto×periodo (lag_features.agregar_mensal).
+    Returns (series forecasts, Produto forecasts, company forecasts, stats dict).
+    """
+    per = agg[PERIODO].to_numpy().astype(np.int64)
+    p0, p1 = int(per.min()), int(per.max())
+    T = p1 - p0 + 1
+    val = agg["Vendas_mes"].to_numpy(dtype=np.float64)
+    serie = agg.groupby(["Cliente", "Produto"], observed=True, sort=False).ngroup().to_numpy()
+    keys = agg.drop_duplicates(["Cliente", "Produto"])[["Cliente", "Produto"]].reset_index(drop=True)
+    n_s = len(keys)
+
+    total = np.bincount(per - p0, weights=val, minlength=T)
+    sidx = seasonal_index(total, p0)
+
+    # series batches: agg is sorted by series, so each batch is a contiguous row range
+    bounds = np.searchsorted(serie, np.arange(0, n_s + batch, batch).clip(max=n_s))
+    tasks = []
+    for a, b, s0 in zip(bounds[:-1], bounds[1:], range(0, n_s, batch)):
+        nb = min(batch, n_s - s0)
+        Y, start = _dense(serie[a:b] - s0, per[a:b], val[a:b], nb, p0, T)
+        tasks.append((Y, start, p0, horizon, min_obs, sidx))
+    workers = max(1, min(len(tasks), workers or os.cpu_count() or 1))
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        res = list(ex.map(_fit_batch, tasks))
+    wall = time.perf_counter() - t0
+    F = np.vstack([r[0] for r in res]) if res else np.zeros((0, horizon))
+    ok = np.concatenate([r[1] for r in res]) if res else np.zeros(0, dtype=bool)
+    fit_s = sum(r[2] for r in res)
+
+    # base forecasts per Produto and for the company (same model, one series each)
+    prod_codes, prod_names = pd.factorize(agg["Produto"].astype(str), sort=True)
+    Yp, sp_ = _dense(prod_codes, per, val, len(prod_names), p0, T)
+    Fp, _ = fit_dense(Yp, sp_, p0, horizon, min_obs, sidx)
+    Fc, _ = fit_dense(total[None, :], np.zeros(1, dtype=np.int64), p0, horizon, min_obs, sidx)
+
+    # top-down reconciliation: company -> Produto -> series
+    Fp_rec = top_down(Fp, np.zeros(len(Fp), dtype=np.int64), Fc)
+    serie_prod = np.searchsorted(np.asarray(prod_names), keys["Produto"].astype(str).to_numpy())
+    F_rec = top_down(F, serie_prod, Fp_rec)
+    bottom_up = np.zeros_like(Fp)
+    np.add.at(bottom_up, serie_prod, F)
+
+    periods = np.arange(p1 + 1, p1 + 1 + horizon)
+    labels = [f"{(p - 1) // 12}-{(p - 1) % 12 + 1:02d}" for p in periods]
+    series = keys.loc[np.repeat(np.arange(n_s), horizon)].reset_index(drop=True)
+    series["Periodo"] = np.tile(labels, n_s)
+    series["Previsao_base"] = F.ravel()
+    series["Previsao"] = F_rec.ravel()
+    series["Modelo"] = np.repeat(np.where(ok, "serie", "sazonal"), horizon)
+    produto = pd.DataFrame({"Produto": np.repeat(np.asarray(prod_names), horizon),
+                            "Periodo": np.tile(labels, len(prod_names)),
+                            "Previsao_base": Fp.ravel(), "Previsao": Fp_rec.ravel(),
+                            "Soma_series_base": bottom_up.ravel()})
+    empresa = pd.DataFrame({"Periodo": labels, "Previsao": Fc.ravel(), "Soma_series": F_rec.sum(axis=0),
+                            "Soma_series_base": F.sum(axis=0)})
+    stats = {"Series": n_s, "Modelo_proprio": int(ok.sum()), "Fallback_sazonal": int((~ok).sum()),
+             "Lotes": len(tasks), "Workers": workers, "Tempo_s": wall,
+             "Series_por_s": n_s / wall if wall else np.nan,
+             "Fit_por_serie_us": 1e6 * fit_s / n_s if n_s else np.nan}
+    return series, produto, empresa, stats
+
+def backtest(agg: pd.DataFrame, horizon=HORIZON, **kw) -> pd.DataFrame:
+    """Hold out the last `horizon` periods and score base vs reconciled forecasts (WAPE) per level."""
+    cut = int(agg[PERIODO].max()) - horizon
+    series, produto, empresa, _ = forecast(agg[agg[PERIODO] <= cut], horizon, **kw)
+    fut = agg[agg[PERIODO] > cut].assign(
+        Periodo=lambda d: [f"{(p - 1) // 12}-{(p - 1) % 12 + 1:02d}" for p in d[PERIODO]])
+    rows = []
+    for level, table, keys in (("Cliente×Produto", series, ["Cliente", "Produto"]),
+                               ("Produto", produto, ["Produto"]), ("Empresa", empresa, [])):
+        real = fut.groupby(keys + ["Periodo"], observed=True)["Vendas_mes"].sum().rename("Real").reset_index()
+        for k in keys:
+            real[k] = real[k].astype(str)
+            table = table.assign(**{k: table[k].astype(str)})
+        m = table.merge(real, on=keys + ["Periodo"], how="outer").fillna({"Real": 0.0})
+        m = m.fillna(0.0) if not keys else m.fillna({"Previsao": 0.0, "Previsao_base": 0.0})
+        for col in ("Previsao_base", "Previsao"):
+            if col in m:
+                rows.append([level, col, float(np.abs(m[col] - m["Real"]).sum() / max(m["Real"].abs().sum(), 1e-9))])
+    return pd.DataFrame(rows, columns=["Nivel", "Previsao", "WAPE"])
+
+def main():
+    df = load_sales(DATA)
+    agg = agregar_mensal(df)
+    kw = dict(batch=BATCH, workers=int(FLAGS["workers"]) if FLAGS.get("workers") else None, min_obs=MIN_OBS)
+    series, produto, empresa, stats = forecast(agg, HORIZON, **kw)
+    sheets = {"series": series, "produto": produto, "empresa": empresa,
+              "desempenho": pd.DataFrame([stats])}
+    if "backtest" in FLAGS:
+        sheets["backtest"] = backtest(agg, HORIZON, **kw)
+
+    OUT.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(OUT, engine="openpyxl") as writer:
+        for name, table in sheets.items():
+            table.to_excel(writer, sheet_name=name, index=False)
+
+    print(f"✅ {stats['Series']} series forecast {HORIZON} months ahead "
+          f"({stats['Modelo_proprio']} own model, {stats['Fallback_sazonal']} seasonal-level fallback)")
+    print(f"⏱️ {stats['Tempo_s']:.2f}s in {stats['Lotes']} batches × {stats['Workers']} workers: "
+          f"{stats['Series_por_s']:.0f} series/s, {stats['Fit_por_serie_us']:.1f} µs fit per series")
+    print("\n=== Company (forecast, sum of reconciled series, sum of base series) ===")
+    print(empresa)
+    if "backtest" in sheets:
+        print("\n=== Backtest (WAPE, last horizon months held out) ===")
+        print(sheets["backtest"])
+    print("\n📂 Forecasts saved to:", OUT)
+
+if __name__ == "__main__":
+    main()
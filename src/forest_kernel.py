@@ -0,0 +1,267 @@
+from pathlib import Path
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_access import DATA_CLEAN, load_sales
+from feature_cache import source_groups
+from model_store import MODELS_DIR, load_model, model_path
+
+# =========================
+# Flattened Random Forest inference kernel
+# =========================
+# The fitted ColumnTransformer + forest are compiled into flat node arrays
+# (all trees concatenated): feature, threshold, children, value (float32),
+# plus `category` for splits on a one-hot column. Rows are encoded once into a
+# small float32 matrix of SOURCE columns (numerics as-is, categoricals as the
+# encoder's category code, -1 if unknown), so no one-hot matrix is built: a split
+# on one-hot column "Cliente_X" becomes the test (code == X) <= threshold.
+# Traversal is vectorized over rows × trees: every step moves all (row, tree)
+# pairs one level down (leaves point to themselves; finished pairs are dropped
+# once they are a quarter of the block), in blocks of CHUNK_CELLS pairs.
+# Thresholds are stored as the largest float32 <= sklearn's float64 threshold,
+# so the comparison on float32 inputs takes exactly the same branches.
+# Non-numeric, missing or infinite numerics are rejected with ValueError, as the
+# sklearn pipeline does (`verify` checks that both reject the same inputs).
+# Arrays are saved as .npy in models/<name>_kernel/ and memory-mapped on load.
+#
+#   python src/forest_kernel.py [--model=random_forest] [--sample=5000] [--rtol=1e-5]
+FLAGS = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "")
+             for a in sys.argv[1:] if a.startswith("--"))
+CHUNK_CELLS = 1 << 22           # rows × trees per traversal block (~16 MB of node ids)
+_ARRAYS = ("feature", "threshold", "children", "value", "category", "nan_left", "roots")
+
+def kernel_dir(name: str) -> Path:
+    return MODELS_DIR / f"{name}_kernel"
+
+def _source_fingerprint(name: str) -> list:
+    st = model_path(name).stat()
+    return [st.st_size, st.st_mtime_ns]
+
+class ForestKernel:
+    """Compiled forest: encode(df) -> float32 source matrix, predict(df) / tree_predictions(df)."""
+    def __init__(self, arrays: dict, meta: dict):
+        for k in _ARRAYS:
+            setattr(self, k, arrays[k])
+        self.meta = meta
+        self.num_cols, self.cat_cols = meta["num_cols"], meta["cat_cols"]
+        self.columns = self.num_cols + self.cat_cols
+        self.n_trees, self.depth = len(self.roots), meta["max_depth"]
+        self._lookup = {c: pd.Index(cats) for c, cats in zip(self.cat_cols, meta["categories"])}
+
+    @classmethod
+    def compile(cls, preproc, forest) -> "ForestKernel":
+        num_cols = list(preproc.transformers_[0][2])
+        cat_cols = list(preproc.transformers_[1][2])
+        cats = list(preproc.named_transformers_["cat"].categories_) if cat_cols else []
+        # encoded column -> (source column, category code or -1)
+        n_enc = forest.n_features_in_
+        src, code = np.zeros(n_enc, np.int32), np.full(n_enc, -1, np.int32)
+        for i, (c, pos) in enumerate(source_groups(preproc).items()):
+            src[pos] = i
+            if c in cat_cols:
+                code[pos] = np.arange(len(pos))
+
+        parts, roots, offset = [], [], 0
+        for est in forest.estimators_:
+            t = est.tree_
+            n = t.node_count
+            leaf = t.children_left < 0
+            ids = np.arange(offset, offset + n, dtype=np.int32)
+            feat = np.where(leaf, 0, t.feature)
+            thr = t.threshold.astype(np.float32)
+            thr = np.where(thr > t.threshold, np.nextafter(thr, np.float32(-np.inf)), thr)
+            parts.append({
+                "feature": np.where(leaf, 0, src[feat]).astype(np.int32),
+                "threshold": np.where(leaf, np.inf, thr).astype(np.float32),
+                # interleaved (left, right): next node = children[2 * node + go_right]
+                "children": np.column_stack([np.where(leaf, ids, t.children_left + offset),
+                                             np.where(leaf, ids, t.children_right + offset)]
+                                            ).astype(np.int32).ravel(),
+                "value": t.value[:, 0, 0].astype(np.float32),
+                "category": np.where(leaf, -1, code[feat]).astype(np.int32),
+                "nan_left": (leaf | getattr(t, "missing_go_to_left", np.zeros(n, bool)).astype(bool)).astype(np.uint8),
+            })
+            roots.append(offset)
+            offset += n
+        arrays = {k: np.concatenate([p[k] for p in parts]) for k in _ARRAYS[:-1]}
+        arrays["roots"] = np.asarray(roots, dtype=np.int32)
+        meta = {"num_cols": num_cols, "cat_cols": cat_cols,
+                "categories": [np.asarray(c).tolist() for c in cats],
+                "max_depth": int(max(e.tree_.max_depth for e in forest.estimators_)),
+                "n_nodes": int(offset)}
+        return cls(arrays, meta)
+
+    def encode(self, df: pd.DataFrame) -> np.ndarray:
+        """Source-column matrix (float32): numerics as-is, categoricals as category codes (-1 = unknown)."""
+        X = np.empty((len(df), len(self.columns)), dtype=np.float32)
+        for j, c in enumerate(self.num_cols):
+            X[:, j] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64)
+            bad = np.flatnonzero(~np.isfinite(X[:, j]))
+            if len(bad):
+                what = "infinity or a value too large for float32" if np.isinf(X[bad[0], j]) else "NaN or a non-numeric value"
+                raise ValueError(f"Input X contains {what}: column {c!r}, row {int(bad[0])} ({df[c].iloc[bad[0]]!r})")
+        for j, c in enumerate(self.cat_cols, start=len(self.num_cols)):
+            X[:, j] = self._lookup[c].get_indexer(df[c].astype(object))
+        return X
+
+    def _traverse(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node id for every (row, tree) of one block."""
+        n, m = X.shape
+        flat = np.ascontiguousarray(X).ravel()
+        has_nan = bool(np.isnan(flat).any())
+        leaf = np.tile(self.roots, n)                        # pair p = (row p // n_trees, tree p % n_trees)
+        pair = np.arange(n * self.n_trees)                   # pairs still being routed
+        node, base = leaf.copy(), np.repeat(np.arange(n) * m, self.n_trees)
+        for _ in range(self.depth + 1):
+            x = flat.take(base + self.feature.take(node))
+            cat = self.category.take(node)
+            # one-hot split: value (code == cat) <= threshold (0.5) <=> code != cat
+            go_right = np.where(cat >= 0, x == cat, x > self.threshold.take(node))
+            if has_nan:
+                miss = np.isnan(x)
+                go_right[miss] = ~self.nan_left.take(node[miss]).astype(bool)
+            nxt = self.children.take(2 * node + go_right)
+            done = nxt == node                               # leaves point to themselves
+            n_done = int(np.count_nonzero(done))
+            if n_done == len(node):
+                break
+            if 4 * n_done > len(node):                       # drop finished pairs only when worth it
+                leaf[pair[done]] = node[done]
+                keep = ~done
+                pair, nxt, base = pair[keep], nxt[keep], base[keep]
+            node = nxt
+        leaf[pair] = node
+        return leaf.reshape(n, self.n_trees)
+
+    def _blocks(self, X: np.ndarray, chunk: int | None):
+        step = chunk or max(1, CHUNK_CELLS // max(self.n_trees, 1))
+        for a in range(0, len(X), step):
+            yield a, self._traverse(X[a:a + step])
+
+    def tree_predictions(self, data, chunk: int | None = None) -> np.ndarray:
+        """(rows × trees) float32 matrix of per-tree predictions (data = DataFrame or encoded matrix)."""
+        X = self.encode(data) if isinstance(data, pd.DataFrame) else np.asarray(data, dtype=np.float32)
+        out = np.empty((len(X), self.n_trees), dtype=np.float32)
+        for a, node in self._blocks(X, chunk):
+            out[a:a + len(node)] = self.value[node]
+        return out
+
+    def predict(self, data, chunk: int | None = None) -> np.ndarray:
+        X = self.encode(data) if isinstance(data, pd.DataFrame) else np.asarray(data, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        for a, node in self._blocks(X, chunk):
+            out[a:a + len(node)] = self.value[node].sum(axis=1, dtype=np.float64) / self.n_trees
+        return out
+
+    def predict_quantiles(self, data, quantiles, chunk: int | None = None) -> np.ndarray:
+        """(rows × len(quantiles)) quantiles of the per-tree predictions, one block at a time."""
+        X = self.encode(data) if isinstance(data, pd.DataFrame) else np.asarray(data, dtype=np.float32)
+        out = np.empty((len(X), len(quantiles)), dtype=np.float64)
+        for a, node in self._blocks(X, chunk):
+            out[a:a + len(node)] = np.quantile(self.value[node], quantiles, axis=1).T
+        return out
+
+    def save(self, out: Path, meta: dict | None = None) -> Path:
+        out = Path(out)
+        tmp = out.with_name(out.name + ".tmp")
+        tmp.mkdir(parents=True, exist_ok=True)
+        for k in _ARRAYS:
+            np.save(tmp / f"{k}.npy", np.ascontiguousarray(getattr(self, k)))
+        (tmp / "meta.json").write_text(json.dumps({**self.meta, **(meta or {})}, indent=2, ensure_ascii=False),
+                                       encoding="utf-8")
+        if out.exists():
+            for f in out.iterdir():
+                f.unlink()
+            out.rmdir()
+        tmp.replace(out)
+        return out
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "ForestKernel":
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        arrays = {k: np.load(path / f"{k}.npy", mmap_mode="r" if mmap else None) for k in _ARRAYS}
+        return cls(arrays, meta)
+
+def load_kernel(name: str = "random_forest", mmap: bool = True) -> ForestKernel | None:
+    """The exported kernel of models/<name>.joblib, or None if missing or older than the model."""
+    d = kernel_dir(name)
+    if not (d / "meta.json").exists() or not model_path(name).exists():
+        return None
+    kernel = ForestKernel.load(d, mmap)
+    return kernel if kernel.meta.get("source") == _source_fingerprint(name) else None
+
+def verify(kernel: ForestKernel, pipeline, df: pd.DataFrame, rtol: float = 1e-5) -> dict:
+    """Compare kernel and sklearn predictions on df; raises AssertionError beyond rtol (relative to the target scale)."""
+    ref = pipeline.predict(df[list(pipeline.named_steps["prep"].feature_names_in_)])
+    got = kernel.predict(df)
+    err = np.abs(got - ref)
+    scale = max(float(np.abs(ref).max()), 1.0)
+    stats = {"rows": len(df), "max_abs_err": float(err.max()), "max_rel_err": float(err.max() / scale)}
+    assert stats["max_rel_err"] <= rtol, f"Kernel differs from sklearn: {stats}"
+    # invalid numerics: both must raise ValueError (the prediction route answers 400 either way)
+    cols = list(pipeline.named_steps["prep"].feature_names_in_)
+    for c in kernel.num_cols:
+        for bad in ("abc", None, np.inf):
+            row = df[cols].head(1).astype(object)
+            row.iloc[0, cols.index(c)] = bad
+            row = pd.DataFrame.from_records(row.to_dict("records"))   # as the route builds it
+            outcome = [_rejects(fn, row) for fn in (pipeline.predict, kernel.predict)]
+            assert outcome == [True, True], f"sklearn / kernel rejection differs for {c}={bad!r}: {outcome}"
+    return stats
+
+def _rejects(fn, df: pd.DataFrame) -> bool:
+    try:
+        fn(df)
+    except ValueError:
+        return True
+    return False
+
+def export(name: str = "random_forest", df: pd.DataFrame | None = None, sample: int = 5000,
+           rtol: float = 1e-5) -> tuple:
+    """Compile models/<name>.joblib, verify it on `sample` rows of df and save models/<name>_kernel/."""
+    bundle = load_model(name)
+    pipe = bundle["pipeline"]
+    kernel = ForestKernel.compile(pipe.named_steps["prep"], pipe.named_steps["model"])
+    df = load_sales(DATA_CLEAN, verbose=False) if df is None else df
+    if sample and sample < len(df):
+        df = df.iloc[np.sort(np.random.default_rng(0).choice(len(df), size=sample, replace=False))]
+    stats = verify(kernel, pipe, df, rtol)
+    out = kernel.save(kernel_dir(name), {"source": _source_fingerprint(name)})
+    return out, kernel, pipe, df, stats
+
+def _latency(fn, X, repeats=20) -> float:
+    fn(X)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn(X)
+    return (time.perf_counter() - t0) / repeats
+
+def main():
+    name = FLAGS.get("model") or "random_forest"
+    t0 = time.perf_counter()
+    out, kernel, pipe, df, stats = export(name, sample=int(FLAGS.get("sample") or 5000),
+                                          rtol=float(FLAGS.get("rtol") or 1e-5))
+    print(f"✅ Kernel {out} ({kernel.meta['n_nodes']:,} nodes, {kernel.n_trees} trees, "
+          f"depth {kernel.depth}) in {time.perf_counter() - t0:.2f}s")
+    print(f"   verified on {stats['rows']:,} rows: max |diff| {stats['max_abs_err']:.3g} "
+          f"(relative {stats['max_rel_err']:.2g})")
+
+    t0 = time.perf_counter()
+    kernel = load_kernel(name)
+    print(f"🧮 mmap load: {1e3 * (time.perf_counter() - t0):.1f} ms")
+    X = df[list(pipe.named_steps["prep"].feature_names_in_)]
+    rows = []
+    for n in (1, 16, 256, len(X)):
+        part = X.iloc[:n]
+        rows.append([n, 1e3 * _latency(pipe.predict, part, 5), 1e3 * _latency(kernel.predict, part, 5)])
+    lat = pd.DataFrame(rows, columns=["Linhas", "sklearn_ms", "kernel_ms"])
+    lat["Speedup"] = lat["sklearn_ms"] / lat["kernel_ms"]
+    print("\n=== Latency per call ===")
+    print(lat.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
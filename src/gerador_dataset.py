@@ -4,7 +4,12 @@
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numbers
+import os
 import random
+import sys
 
 # -------------------------------
 # Configuração
@@ -32,6 +37,19 @@ MARGEM_VAL  = "Margem_Valor"
 # Colunas esperadas (para validação rápida)
 COLS_ESPERADAS = ["Ano", "Mês", "Cliente", VENDAS_COL, "Produto", CANAL_COL, MARGEM_PCT, MARGEM_VAL]
 
+# Catálogo para o gerador em larga escala (nomes já corrigidos)
+CLIENTES = ["Confeitaria Diamante", "Distribuidora Frescor", "Hipermercado Maxi", "Hotel Alvalade",
+            "Hotel Epic Sana", "Intermarket Angola", "Kero", "Mercado Fresco", "Padaria Nova Era",
+            "Padaria N’Gola", "Padaria Popular", "Pastelaria Doce Sabor", "Pastelaria Estrela",
+            "Pastelaria Nuvem Doce", "Pão & Companhia", "Royal Panificadora", "Shoprite",
+            "Supermercado Kero"]
+PRODUTOS = ["Açúcar Gelado", "Cacau em Pó", "Chantili Instantâneo", "Chocolate Origens",
+            "Cobertura Sabor Morango", "Creme Pasteleiro", "Fermento Seco", "Geleia Neutra",
+            "Melhorante Panificação", "Pré-Mistura Bolo"]
+CANAIS = ["Grossista", "Retalho"]
+ANOS = (2020, 2025)
+BLOCO_LINHAS = 1_000_000
+
 # -------------------------------
 # Funções auxiliares
 # -------------------------------
@@ -64,47 +82,240 @@ def expandir_para_500(df: pd.DataFrame, target_rows: int = TARGET_ROWS) -> pd.Da
     df_ext = df_ext.sample(target_rows, random_state=SEED).reset_index(drop=True)
     return df_ext
 
+# Especificação declarativa das anomalias. Cada "taxa" pode ser uma fração das
+# linhas (float < 1) ou um número absoluto de linhas (int). Em "erros_cliente",
+# em vez de taxa+mapa pode dar-se "nomes": lista de grafias escritas em linhas aleatórias.
+ANOMALIAS_PADRAO = {
+    "omissos":        {VENDAS_COL: 0.008, MARGEM_PCT: 0.008},
+    "outliers":       {VENDAS_COL: {"taxa": 0.004, "fator": 50}},          # fator × máximo atual
+    "fora_intervalo": {MARGEM_PCT: {"taxa": 0.004, "valores": [-10, 120]}},  # fora de [0, 100]
+    "erros_cliente":  {"taxa": 0.006,
+                       "mapa": {"Kero": "Kéro", "Shoprite": "Shopritee",
+                                "Mercado Fresco": "Mercado Frescco"}},
+}
+
+def _n_linhas(taxa, n: int) -> int:
+    k = int(taxa) if isinstance(taxa, numbers.Integral) else int(round(taxa * n))
+    return min(max(k, 0), n)
+
+def aplicar_anomalias(df: pd.DataFrame, espec: dict = ANOMALIAS_PADRAO,
+                      rng: np.random.Generator | None = None):
+    """
+    Aplica a especificação numa única passagem vetorizada.
+    Devolve (df_com_anomalias, mascara), onde a máscara tem uma coluna booleana
+    por tipo de anomalia/coluna e 'anomala' = qualquer uma (verdade de referência
+    para medir a recolha da limpeza).
+    """
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    n = len(df)
+    dfa = df.reset_index(drop=True).copy()
+    mascara = {}
+
+    # Omissos, outliers e valores fora do intervalo: posições disjuntas por coluna,
+    # tiradas de uma só vez com rng.choice(replace=False).
+    colunas = (set(espec.get("omissos", {})) | set(espec.get("outliers", {}))
+               | set(espec.get("fora_intervalo", {})))
+    for col in colunas:
+        k_om = _n_linhas(espec.get("omissos", {}).get(col, 0), n)
+        out = espec.get("outliers", {}).get(col)
+        fora = espec.get("fora_intervalo", {}).get(col)
+        k_out = _n_linhas(out["taxa"], n) if out else 0
+        k_fora = _n_linhas(fora["taxa"], n) if fora else 0
+        idx = rng.choice(n, size=min(k_om + k_out + k_fora, n), replace=False)
+        i_om, i_out, i_fora = np.split(idx, [k_om, k_om + k_out])
+
+        vals = dfa[col].to_numpy(dtype="float64", copy=True)
+        maximo = np.nanmax(vals) if n else np.nan
+        vals[i_om] = np.nan
+        if out:
+            vals[i_out] = maximo * out["fator"]
+        if fora:
+            vals[i_fora] = np.resize(np.asarray(fora["valores"], dtype="float64"), len(i_fora))
+        dfa[col] = vals
+
+        # colunas da máscara fixas pela especificação (esquema igual em todos os blocos)
+        for nome, ii, ativo in (("omisso", i_om, col in espec.get("omissos", {})),
+                                ("outlier", i_out, bool(out)), ("fora_intervalo", i_fora, bool(fora))):
+            if ativo:
+                m = np.zeros(n, dtype=bool)
+                m[ii] = True
+                mascara[f"{nome}_{col}"] = m
+
+    # Erros ortográficos: com "mapa", só em linhas cujo cliente tem grafia errada
+    # definida; com "nomes", cada nome errado é escrito numa linha aleatória.
+    erros = espec.get("erros_cliente")
+    if erros and "Cliente" in dfa.columns:
+        cli = dfa["Cliente"].to_numpy(dtype=object, copy=True)
+        if "nomes" in erros:
+            nomes = np.asarray(erros["nomes"], dtype=object)
+            idx = rng.choice(n, size=min(len(nomes), n), replace=False)
+            cli[idx] = nomes[:len(idx)]
+        else:
+            mapa = erros["mapa"]
+            candidatos = np.flatnonzero(dfa["Cliente"].isin(list(mapa)).to_numpy())
+            k = min(_n_linhas(erros["taxa"], n), len(candidatos))
+            idx = rng.choice(candidatos, size=k, replace=False) if k else candidatos[:0]
+            cli[idx] = pd.Series(cli[idx], dtype=object).map(mapa).to_numpy()
+        dfa["Cliente"] = cli
+        m = np.zeros(n, dtype=bool)
+        m[idx] = True
+        mascara["erro_Cliente"] = m
+
+    mascara = pd.DataFrame(mascara, index=dfa.index)
+    mascara["anomala"] = mascara.any(axis=1)
+    return dfa, mascara
+
 def injetar_anomalias(df: pd.DataFrame,
                       n_missing_vendas: int = 4,
                       n_missing_margem: int = 4,
                       n_outliers_vendas: int = 2,
                       inserir_outliers_margem: bool = True,
                       clientes_errados: list[str] = None) -> pd.DataFrame:
-    """Cria valores omissos, outliers e erros ortográficos simulados."""
-    dfa = df.copy()
-
-    # 1) Missing values
-    if n_missing_vendas > 0:
-        idx = random.sample(range(len(dfa)), n_missing_vendas)
-        dfa.loc[idx, VENDAS_COL] = np.nan
-
-    if n_missing_margem > 0:
-        idx = random.sample(range(len(dfa)), n_missing_margem)
-        dfa.loc[idx, MARGEM_PCT] = np.nan
-
-    # 2) Outliers em vendas (exagerar vs. máximo atual)
-    if n_outliers_vendas > 0:
-        idx = random.sample(range(len(dfa)), n_outliers_vendas)
-        fator = 50  # 50x o máximo atual
-        dfa.loc[idx, VENDAS_COL] = dfa[VENDAS_COL].max() * fator
-
-    # 3) Outliers em margem (fora do intervalo [0, 100])
-    if inserir_outliers_margem:
-        dfa.loc[random.randrange(len(dfa)), MARGEM_PCT] = -10   # negativo
-        dfa.loc[random.randrange(len(dfa)), MARGEM_PCT] = 120   # acima de 100
-
-    # 4) Erros ortográficos em clientes
+    """Cria valores omissos, outliers e erros ortográficos simulados (contagens absolutas)."""
     if not clientes_errados:
         clientes_errados = ["Kéro", "Shopritee", "Mercado Frescco"]
-    for nome_errado in clientes_errados:
-        dfa.loc[random.randrange(len(dfa)), "Cliente"] = nome_errado
-
+    espec = {
+        "omissos":  {VENDAS_COL: int(n_missing_vendas), MARGEM_PCT: int(n_missing_margem)},
+        "outliers": {VENDAS_COL: {"taxa": int(n_outliers_vendas), "fator": 50}},
+        "fora_intervalo": ({MARGEM_PCT: {"taxa": 2, "valores": [-10, 120]}}
+                           if inserir_outliers_margem else {}),
+        "erros_cliente": {"nomes": list(clientes_errados)},
+    }
+    dfa, _ = aplicar_anomalias(df, espec, np.random.default_rng(SEED))
     return dfa
 
+# -------------------------------
+# Gerador em larga escala (1M–100M linhas)
+# -------------------------------
+# Os parâmetros de cada série (nível por cliente, multiplicadores de produto/canal,
+# amplitude e fase sazonal por Cliente×Produto) derivam só da SEED, pelo que são
+# idênticos em todos os processos. Cada bloco usa o seu próprio stream
+# (SeedSequence.spawn) -> resultado reprodutível e independente do nº de workers.
+def catalogo(n_clientes: int = len(CLIENTES)) -> dict:
+    clientes = CLIENTES[:n_clientes] + [f"Cliente {i:05d}" for i in range(len(CLIENTES), n_clientes)]
+    return {"Cliente": np.array(clientes, dtype=object),
+            "Produto": np.array(PRODUTOS, dtype=object),
+            "Canal":   np.array(CANAIS, dtype=object)}
+
+def parametros_series(n_clientes: int, seed: int = SEED) -> dict:
+    rng = np.random.default_rng(np.random.SeedSequence([seed, n_clientes]))
+    n_p, n_k = len(PRODUTOS), len(CANAIS)
+    return {
+        "nivel_cliente": rng.lognormal(np.log(20_000), 0.35, n_clientes),
+        "mult_produto":  rng.uniform(0.6, 1.5, n_p),
+        "mult_canal":    rng.uniform(0.8, 1.2, n_k),
+        "amp":           rng.uniform(0.05, 0.35, (n_clientes, n_p)),
+        "fase":          rng.uniform(0, 12, (n_clientes, n_p)),
+        "tendencia":     rng.normal(0.03, 0.02, n_clientes),      # crescimento anual
+        "margem_produto": rng.uniform(0.15, 0.40, n_p),
+    }
+
+def gerar_bloco(n: int, seq: np.random.SeedSequence, par: dict) -> dict:
+    """Gera um bloco de n linhas só com operações NumPy (categóricas como códigos)."""
+    rng = np.random.default_rng(seq)
+    n_c, n_p = par["amp"].shape
+    c = rng.integers(0, n_c, n, dtype=np.int32)
+    p = rng.integers(0, n_p, n, dtype=np.int16)
+    k = rng.integers(0, len(par["mult_canal"]), n, dtype=np.int8)
+    ano = rng.integers(ANOS[0], ANOS[1] + 1, n, dtype=np.int16)
+    mes = rng.integers(1, 13, n, dtype=np.int8)
+
+    sazonal = 1 + par["amp"][c, p] * np.sin(2 * np.pi * (mes - par["fase"][c, p]) / 12)
+    tendencia = (1 + par["tendencia"][c]) ** (ano - ANOS[0])
+    vendas = (par["nivel_cliente"][c] * par["mult_produto"][p] * par["mult_canal"][k]
+              * sazonal * tendencia * rng.lognormal(0, 0.15, n))
+    margem = np.clip(par["margem_produto"][p] + rng.normal(0, 0.03, n), 0.05, 0.6)
+    return {"Ano": ano, "Mês": mes, "Cliente": c, VENDAS_COL: np.round(vendas, 2),
+            "Produto": p, CANAL_COL: k, MARGEM_PCT: np.round(margem, 2),
+            MARGEM_VAL: np.round(vendas * margem, 2)}
+
+def _tarefa_bloco(args):
+    n, seq, n_clientes, seed = args
+    return gerar_bloco(n, seq, parametros_series(n_clientes, seed))
+
+def _bloco_para_df(bloco: dict, cat: dict) -> pd.DataFrame:
+    cols = {}
+    for c in COLS_ESPERADAS:
+        v = bloco[c]
+        cols[c] = cat[c][v] if c in cat else v
+    return pd.DataFrame(cols)
+
+def gerar_grande(n_linhas: int, saida: Path, n_clientes: int = len(CLIENTES),
+                 bloco: int = BLOCO_LINHAS, workers: int | None = None, seed: int = SEED,
+                 anomalias: dict | None = None) -> Path:
+    """
+    Gera n_linhas em blocos paralelos e escreve-os por ordem em Parquet ou CSV
+    (pela extensão de `saida`). A memória fica limitada a ~2 blocos por worker.
+    Com `anomalias`, cada bloco passa por aplicar_anomalias e a máscara de
+    referência é gravada em <saida>_mascara.parquet.
+    """
+    saida = Path(saida)
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    tamanhos = [bloco] * (n_linhas // bloco) + ([n_linhas % bloco] if n_linhas % bloco else [])
+    seqs = np.random.SeedSequence(seed).spawn(len(tamanhos))
+    tarefas = [(n, s, n_clientes, seed) for n, s in zip(tamanhos, seqs)]
+    cat = catalogo(n_clientes)
+
+    parquet = saida.suffix.lower() == ".parquet"
+    if parquet or anomalias:                  # a máscara das anomalias é sempre Parquet
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    writer, writer_m = None, None
+    saida_m = saida.with_name(f"{saida.stem}_mascara.parquet")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            pendentes, proximas = deque(), iter(tarefas)
+            for t in proximas:                       # janela limitada de blocos em voo
+                pendentes.append(ex.submit(_tarefa_bloco, t))
+                if len(pendentes) >= 2 * workers:
+                    break
+            primeiro, i = True, 0
+            while pendentes:
+                df = _bloco_para_df(pendentes.popleft().result(), cat)
+                if anomalias:
+                    df, m = aplicar_anomalias(df, anomalias, np.random.default_rng(seqs[i].spawn(1)[0]))
+                    tab_m = pa.Table.from_pandas(m, preserve_index=False)
+                    if writer_m is None:
+                        writer_m = pq.ParquetWriter(saida_m, tab_m.schema)
+                    writer_m.write_table(tab_m)
+                i += 1
+                nxt = next(proximas, None)
+                if nxt is not None:
+                    pendentes.append(ex.submit(_tarefa_bloco, nxt))
+                if parquet:
+                    tab = pa.Table.from_pandas(df, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(saida, tab.schema)
+                    writer.write_table(tab)
+                else:
+                    df.to_csv(saida, mode="w" if primeiro else "a", header=primeiro, index=False)
+                primeiro = False
+    finally:
+        for w in (writer, writer_m):
+            if w is not None:
+                w.close()
+    return saida
+
 # -------------------------------
 # Pipeline
 # -------------------------------
 def main():
+    # Modo larga escala: python src/gerador_dataset.py --linhas=10000000 --saida=data/raw/biagio_10M.parquet [--anomalias]
+    flags = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "1")
+                 for a in sys.argv[1:] if a.startswith("--"))
+    if "linhas" in flags:
+        n = int(flags["linhas"])
+        saida = gerar_grande(
+            n, Path(flags.get("saida", OUTPUT_DIR / f"dataset_biagio_{n}linhas.parquet")),
+            n_clientes=int(flags.get("clientes", len(CLIENTES))),
+            bloco=int(flags.get("bloco", BLOCO_LINHAS)),
+            workers=int(flags["workers"]) if "workers" in flags else None,
+            anomalias=ANOMALIAS_PADRAO if "anomalias" in flags else None,
+        )
+        print(f"Linhas geradas: {n} -> {saida.resolve()}")
+        return
+
     # 0) Ler dados
     df = pd.read_excel(INPUT_PATH)
     validar_colunas(df)
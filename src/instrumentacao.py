@@ -0,0 +1,163 @@
+from pathlib import Path
+from contextlib import contextmanager
+import cProfile
+import datetime as dt
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+
+# =========================
+# Instrumentação das etapas (tempo, CPU, memória, cProfile)
+# =========================
+# Uso num script:
+#
+#   @instrumentar("clean_data")
+#   def main():
+#       with etapa("ler"):
+#           df = read_table(RAW)
+#       ...
+#
+# Cada etapa regista tempo real, tempo de CPU do processo, RSS atual e máximo
+# (ru_maxrss) e, com BIAGIO_TRACEMALLOC=1, o pico de memória alocada pelo Python/NumPy
+# dentro da etapa. No fim (também em caso de erro) é escrito reports/run_<nome>.json.
+# Com BIAGIO_PROFILE=1 toda a execução corre sob cProfile: o perfil completo fica em
+# reports/run_<nome>.prof (abrir com `python -m pstats` ou snakeviz) e as funções
+# com maior tempo acumulado vão para o relatório JSON.
+# `etapa` fora de uma execução instrumentada não faz nada, por isso também pode ser
+# usado em funções partilhadas entre scripts.
+REPORTS = Path(".").resolve() / "reports"
+PROFILE = os.getenv("BIAGIO_PROFILE", "") not in ("", "0")
+TRACEMALLOC = os.getenv("BIAGIO_TRACEMALLOC", "") not in ("", "0")
+TOP_FUNCOES = int(os.getenv("BIAGIO_PROFILE_TOP", 25))
+
+def _rss_mb() -> float | None:
+    """RSS atual (Linux: /proc/self/statm); None noutros sistemas."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _rss_max_mb() -> float:
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1e6 if sys.platform == "darwin" else kb * 1024 / 1e6   # macOS devolve bytes, Linux KiB
+
+class Execucao:
+    """Registo das etapas de uma execução; ver `instrumentar`."""
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.etapas = []
+        self.inicio = dt.datetime.now().isoformat(timespec="seconds")
+        self._t0, self._c0 = time.perf_counter(), time.process_time()
+        self._nivel = 0
+        self._picos = []
+        self._perfil = cProfile.Profile() if PROFILE else None
+
+    @contextmanager
+    def etapa(self, nome: str):
+        if TRACEMALLOC:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            antes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            self._picos.append(0)               # maior pico absoluto das etapas internas
+        reg = {"etapa": nome, "nivel": self._nivel}
+        self.etapas.append(reg)
+        self._nivel += 1
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield reg
+        finally:
+            self._nivel -= 1
+            reg["tempo_s"] = time.perf_counter() - t0
+            reg["cpu_s"] = time.process_time() - c0
+            reg["rss_mb"] = _rss_mb()
+            reg["rss_max_mb"] = _rss_max_mb()
+            if TRACEMALLOC:
+                pico = max(tracemalloc.get_traced_memory()[1], self._picos.pop())
+                if self._picos:
+                    self._picos[-1] = max(self._picos[-1], pico)
+                reg["tracemalloc_pico_mb"] = max(pico - antes, 0) / 1e6
+
+    def relatorio(self, erro: BaseException | None = None) -> dict:
+        rel = {"script": self.nome, "inicio": self.inicio, "argv": sys.argv[1:],
+               "pid": os.getpid(), "tempo_s": time.perf_counter() - self._t0,
+               "cpu_s": time.process_time() - self._c0, "rss_max_mb": _rss_max_mb(),
+               "erro": repr(erro) if erro is not None else None, "etapas": self.etapas}
+        if self._perfil is not None:
+            st = pstats.Stats(self._perfil, stream=io.StringIO())
+            rel["perfil"] = [
+                {"funcao": f"{Path(f).name}:{linha}({fn})", "chamadas": nc,
+                 "tempo_proprio_s": tt, "tempo_acumulado_s": ct}
+                for (f, linha, fn), (_, nc, tt, ct, _) in
+                sorted(st.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:TOP_FUNCOES]
+            ]
+        return rel
+
+    def gravar(self, erro: BaseException | None = None, pasta: Path = REPORTS) -> Path:
+        pasta.mkdir(parents=True, exist_ok=True)
+        if self._perfil is not None:
+            self._perfil.disable()
+            self._perfil.dump_stats(pasta / f"run_{self.nome}.prof")
+        out = pasta / f"run_{self.nome}.json"
+        out.write_text(json.dumps(self.relatorio(erro), indent=2, ensure_ascii=False, default=str),
+                       encoding="utf-8")
+        return out
+
+_atual: Execucao | None = None
+
+@contextmanager
+def etapa(nome: str):
+    """Etapa nomeada da execução instrumentada em curso (sem efeito se não houver nenhuma)."""
+    if _atual is None:
+        yield None
+        return
+    with _atual.etapa(nome) as reg:
+        yield reg
+
+def iniciar(nome: str) -> Execucao:
+    """Começa uma execução instrumentada (para código sem main(), ex.: arranque do app_dash)."""
+    global _atual
+    _atual = Execucao(nome)
+    if _atual._perfil is not None:
+        _atual._perfil.enable()
+    return _atual
+
+def terminar(erro: BaseException | None = None) -> Path | None:
+    """Escreve o relatório da execução em curso e devolve o caminho do JSON."""
+    global _atual
+    if _atual is None:
+        return None
+    run, _atual = _atual, None
+    try:
+        return run.gravar(erro)
+    except Exception as e:              # a instrumentação nunca deve fazer falhar o script
+        print(f"⚠️ Relatório de execução não gravado: {e}")
+        return None
+
+def instrumentar(nome: str):
+    """Decorador para main(): uma execução por chamada, relatório gravado mesmo com exceções."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _atual is not None:      # já instrumentado (ex.: main chamada por outro script)
+                with etapa(nome):
+                    return fn(*args, **kwargs)
+            iniciar(nome)
+            try:
+                resultado = fn(*args, **kwargs)
+            except BaseException as e:
+                terminar(e)
+                raise
+            out = terminar()
+            if out is not None:
+                print(f"⏱️ Relatório de execução: {out}")
+            return resultado
+        return wrapper
+    return deco
@@ -0,0 +1,183 @@
+from pathlib import Path
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_access import atualizar_vocab, caminho_temporario, linhas_periodo, load_sales, DATA_CLEAN, PERIODO
+
+# =========================
+# Features de lag / janelas móveis de Vendas por Cliente×Produto
+# =========================
+# Etapa entre clean_data e model_train. As vendas são agregadas por mês e série
+# (Cliente×Produto); cada série×período recebe:
+#   lag_k      vendas da série no período p-k (0 se não houve vendas; NaN antes do 1.º período)
+#   soma_w     soma das vendas nos w períodos anteriores (p-w .. p-1), NaN se a janela
+#   media_w    começa antes do 1.º período dos dados
+#   meses_historico  n.º de períodos, entre os 12 anteriores, em que a série teve vendas
+# Tudo é vetorizado sobre uma chave composta ordenada (serie * K + periodo): os lags são
+# pesquisas exatas (searchsorted) e as janelas diferenças de somas acumuladas — sem
+# ciclos por série. A tabela fica em data/processed/features_lag.parquet e, quando
+# chegam meses novos (ou mudam meses antigos), só são recalculados os períodos a
+# partir do 1.º período alterado, agregando apenas as linhas desde HORIZONTE períodos
+# antes dele. O manifesto guarda, por período, um hash das linhas (Cliente, Produto,
+# Vendas) independente da ordem (somas módulo 2^64 dos hashes das linhas, uma só
+# passagem sobre o frame já ordenado por período) — mover vendas entre clientes ou
+# produtos dentro do mês também conta como alteração.
+# Em juntar(), os NaN de "antes do início dos dados" passam a 0 para os modelos e
+# meses_historico distingue "sem histórico" de "zero vendas". Linhas de df que não
+# existem na tabela (tabela desatualizada) são um erro: correr src/lag_features.py.
+#
+#   python src/lag_features.py [--rebuild]
+ROOT = Path(".").resolve()
+OUT = ROOT / "data" / "processed" / "features_lag.parquet"
+MANIFEST = ROOT / "data" / "processed" / "features_lag.json"
+VERSAO = 2                       # muda com o formato da tabela/manifesto -> reconstrução
+
+LAGS = (1, 2, 3, 12)
+JANELAS = (3, 6, 12)
+SERIE = ["Cliente", "Produto"]
+HORIZONTE = max(LAGS + JANELAS)  # períodos para trás que uma linha consulta
+_K = 1 << 20                     # > qualquer chave de período (Ano*12+Mês)
+
+def agregar_mensal(df: pd.DataFrame) -> pd.DataFrame:
+    """Vendas por Cliente×Produto×período, ordenadas por (série, período)."""
+    agg = (df.reset_index()
+             .groupby(SERIE + [PERIODO], observed=True, sort=True)["Vendas"].sum()
+             .astype("float64").rename("Vendas_mes").reset_index())
+    return agg
+
+def _serie_ids(df: pd.DataFrame) -> np.ndarray:
+    # códigos das categóricas (vocabulário estável entre execuções, ver data_access.load_vocab)
+    c = df["Cliente"].cat.codes.to_numpy().astype(np.int64)
+    p = df["Produto"].cat.codes.to_numpy().astype(np.int64)
+    return c * (len(df["Produto"].cat.categories) + 1) + p
+
+def calcular(agg: pd.DataFrame, desde: int | None = None, p_min: int | None = None) -> pd.DataFrame:
+    """Features das linhas de `agg` com período >= desde (todas se desde=None)."""
+    serie = _serie_ids(agg)
+    per = agg[PERIODO].to_numpy().astype(np.int64)
+    chave = serie * _K + per
+    ordem = np.argsort(chave, kind="stable")
+    chave, v = chave[ordem], agg["Vendas_mes"].to_numpy()[ordem]
+    acum = np.r_[0.0, np.cumsum(v)]
+    p_min = int(per.min()) if p_min is None else p_min
+
+    alvo = np.sort(ordem[per[ordem] >= desde]) if desde is not None else np.arange(len(agg))
+    out = agg.iloc[alvo].reset_index(drop=True)
+    ca, pa = serie[alvo] * _K + per[alvo], per[alvo]
+    for k in LAGS:
+        pos = np.searchsorted(chave, ca - k)
+        achou = pos < len(chave)
+        achou[achou] = chave[pos[achou]] == (ca - k)[achou]
+        lag = np.where(achou, v[np.minimum(pos, len(v) - 1)], 0.0)
+        out[f"lag_{k}"] = np.where(pa - k >= p_min, lag, np.nan)
+    for w in JANELAS:
+        a = np.searchsorted(chave, ca - w, side="left")
+        b = np.searchsorted(chave, ca - 1, side="right")
+        soma = np.where(pa - w >= p_min, acum[b] - acum[a], np.nan)
+        out[f"soma_{w}"] = soma
+        out[f"media_{w}"] = soma / w
+    a = np.searchsorted(chave, ca - HORIZONTE, side="left")
+    b = np.searchsorted(chave, ca - 1, side="right")
+    out["meses_historico"] = (b - a).astype("int8")
+    return out
+
+def _checksums(df: pd.DataFrame) -> dict:
+    """Por período: n.º de linhas e duas somas (mod 2^64) dos hashes (Cliente, Produto, Vendas) das linhas."""
+    if not len(df):
+        return {}
+    h = pd.util.hash_pandas_object(df[SERIE + ["Vendas"]], index=False).to_numpy()
+    mix = (h * np.uint64(0x9E3779B97F4A7C15)) ^ (h >> np.uint64(29))   # 2.ª soma: colisões independentes
+    chaves, inicio = df.attrs["periodos"]["chave"], np.asarray(df.attrs["periodos"]["inicio"])
+    s1, s2 = np.add.reduceat(h, inicio[:-1]), np.add.reduceat(mix, inicio[:-1])
+    return {str(p): f"{n}:{a:016x}{b:016x}" for p, n, a, b in zip(chaves, np.diff(inicio), s1, s2)}
+
+def atualizar(df: pd.DataFrame, rebuild: bool = False):
+    """
+    Atualiza a tabela persistida a partir do frame de load_sales (ordenado por
+    período). Devolve (tabela, períodos recalculados). Só os períodos >= 1.º
+    período novo/alterado são recalculados, a partir das linhas desde
+    HORIZONTE períodos antes dele.
+    """
+    assert "periodos" in df.attrs, "Esperado o frame ordenado por período de load_sales"
+    atualizar_vocab(df)                       # a tabela guarda categóricas: vocabulário em disco
+    novos = _checksums(df)
+    antigos = {}
+    if not rebuild and OUT.exists() and MANIFEST.exists():
+        manifest = json.loads(MANIFEST.read_text(encoding="utf-8"))
+        antigos = manifest.get("periodos", {}) if manifest.get("versao") == VERSAO else {}
+    mudou = sorted(int(p) for p in set(novos) | set(antigos) if novos.get(p) != antigos.get(p))
+    if not mudou:
+        return pd.read_parquet(OUT), 0
+
+    desde = mudou[0] if antigos else None
+    p_min = min(int(p) for p in novos)
+    if antigos and p_min != min(int(p) for p in antigos):
+        desde = None                                    # mudou o 1.º período: tudo de novo
+    agg = agregar_mensal(df.iloc[linhas_periodo(df, None if desde is None else desde - HORIZONTE)])
+    novas = calcular(agg, desde, p_min)
+    if desde is not None:
+        velha = pd.read_parquet(OUT)
+        velha = velha[velha[PERIODO] < desde]
+        for c in SERIE:                                 # vocabulário só cresce
+            velha[c] = velha[c].cat.set_categories(novas[c].cat.categories)
+        tabela = pd.concat([velha, novas], ignore_index=True)
+    else:
+        tabela = novas
+
+    OUT.parent.mkdir(parents=True, exist_ok=True)
+    for out, escrever in ((OUT, lambda t: tabela.to_parquet(t, index=False)),
+                          (MANIFEST, lambda t: t.write_text(json.dumps(
+                              {"versao": VERSAO, "lags": LAGS, "janelas": JANELAS, "periodos": novos},
+                              indent=2), encoding="utf-8"))):
+        tmp = caminho_temporario(out)
+        try:
+            escrever(tmp)
+            tmp.replace(out)
+        finally:
+            tmp.unlink(missing_ok=True)
+    n_rec = len(novos) if desde is None else sum(int(p) >= desde for p in novos)
+    return tabela, n_rec
+
+def juntar(df: pd.DataFrame, tabela: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Acrescenta as features de lag às linhas de df (mesma série×período), sem
+    alterar a ordem nem o índice. Valores em falta (antes do início dos dados)
+    -> 0, com meses_historico a indicar em quantos dos 12 períodos anteriores a
+    série teve vendas. Falha se a tabela não cobrir todas as linhas de df.
+    """
+    tabela = pd.read_parquet(OUT) if tabela is None else tabela
+    if "meses_historico" not in tabela.columns:
+        raise ValueError(f"❌ {OUT.name} está num formato antigo: correr src/lag_features.py")
+    cols = [c for c in tabela.columns if c.startswith(("lag_", "soma_", "media_"))]
+    tabela = tabela.assign(**{c: tabela[c].cat.set_categories(df[c].cat.categories) for c in SERIE})
+    ct = _serie_ids(tabela) * _K + tabela[PERIODO].to_numpy().astype(np.int64)
+    ordem = np.argsort(ct)
+    ct = ct[ordem]
+    cd = _serie_ids(df) * _K + np.asarray(df.index if df.index.name == PERIODO else df[PERIODO], dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ct, cd), max(len(ct) - 1, 0))
+    achou = (ct[pos] == cd) if len(ct) else np.zeros(len(df), dtype=bool)
+    if not achou.all():
+        falta = np.unique(cd[~achou] % _K)
+        raise ValueError(f"❌ {OUT.name} desatualizada: {int((~achou).sum())} linhas sem features "
+                         f"(períodos {falta[:6].tolist()}{' …' if len(falta) > 6 else ''}); "
+                         f"correr src/lag_features.py")
+    out = df.copy()
+    valores = tabela[cols].to_numpy()[ordem][pos]
+    for j, c in enumerate(cols):
+        out[c] = np.nan_to_num(valores[:, j], nan=0.0).astype("float32")
+    out["meses_historico"] = tabela["meses_historico"].to_numpy()[ordem][pos]
+    return out
+
+def main():
+    t0 = time.perf_counter()
+    df = load_sales(DATA_CLEAN)
+    tabela, n_rec = atualizar(df, rebuild="--rebuild" in sys.argv[1:])
+    print(f"✅ Features de lag: {len(tabela):,} linhas série×mês "
+          f"({n_rec} períodos recalculados) em {time.perf_counter() - t0:.2f}s")
+    print(f"📂 {OUT}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error, r2_score
+
+# =========================
+# Metrics engine: one predict per model, metrics by slicing
+# =========================
+# The model predicts ONCE on the full (period-sorted) matrix; train/test/global
+# metrics are slices of that prediction, and the per-segment tables (Cliente,
+# Produto, Canal) are bincount reductions over the segment codes.
+SEGMENTS = ["Cliente", "Produto", "Canal"]
+_EPS = np.finfo(np.float64).eps     # same floor as sklearn's MAPE
+
+def regression_metrics(y, pred):
+    """RMSE, MAPE, R² (sklearn definitions)."""
+    return (np.sqrt(mean_squared_error(y, pred)),
+            mean_absolute_percentage_error(y, pred),
+            r2_score(y, pred))
+
+def split_metrics(y, pred, train_pos, test_pos):
+    """(train + test metrics as 6 values, global metrics as 3 values) from one prediction."""
+    tt = regression_metrics(y[train_pos], pred[train_pos]) + regression_metrics(y[test_pos], pred[test_pos])
+    return tt, regression_metrics(y, pred)
+
+def segment_codes(df: pd.DataFrame, segments=SEGMENTS) -> dict:
+    """{column: (int codes, category labels)} for the segment columns present in df."""
+    out = {}
+    for c in segments:
+        if c in df.columns:
+            cat = df[c] if isinstance(df[c].dtype, pd.CategoricalDtype) else df[c].astype("category")
+            out[c] = (cat.cat.codes.to_numpy(), np.asarray(cat.cat.categories, dtype=object))
+    return out
+
+def _grouped(codes, y, pred, n_g):
+    cnt = np.bincount(codes, minlength=n_g).astype(np.float64)
+    err = pred - y
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sse = np.bincount(codes, weights=err * err, minlength=n_g)
+        ape = np.bincount(codes, weights=np.abs(err) / np.maximum(np.abs(y), _EPS), minlength=n_g)
+        mean = np.bincount(codes, weights=y, minlength=n_g) / cnt
+        d = y - mean[codes]
+        sst = np.bincount(codes, weights=d * d, minlength=n_g)
+        rmse = np.sqrt(sse / cnt)
+        mape = ape / cnt
+        # R² as in sklearn: constant target -> 1 if perfect else 0; undefined below 2 rows
+        r2 = np.where(sst > 0, 1 - sse / np.where(sst > 0, sst, 1), np.where(sse == 0, 1.0, 0.0))
+        r2 = np.where(cnt >= 2, r2, np.nan)
+    return cnt.astype(np.int64), rmse, mape, r2
+
+def segment_metrics(y, pred, codes: dict, sets: dict) -> pd.DataFrame:
+    """
+    Per-segment error table. `codes` comes from segment_codes (aligned with y);
+    `sets` maps a suffix to row positions, e.g. {"Teste": test_pos, "Global": slice(None)}.
+    One row per (Dimensao, Segmento) with N/RMSE/MAPE/R2 columns for every set.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    pred = np.asarray(pred, dtype=np.float64)
+    tables = []
+    for dim, (c, labels) in codes.items():
+        table = pd.DataFrame({"Dimensao": dim, "Segmento": labels})
+        for name, rows in sets.items():
+            cr, yr, pr = c[rows], y[rows], pred[rows]
+            ok = cr >= 0                       # NaN segment -> code -1, left out
+            n, rmse, mape, r2 = _grouped(cr[ok], yr[ok], pr[ok], len(labels))
+            table[f"N_{name}"] = n
+            table[f"RMSE_{name}"] = rmse
+            table[f"MAPE_{name}"] = mape
+            table[f"R2_{name}"] = r2
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
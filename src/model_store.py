@@ -0,0 +1,56 @@
+from pathlib import Path
+import json
+import os
+import joblib
+
+from data_access import caminho_temporario
+
+# =========================
+# Persisted models (joblib)
+# =========================
+# Each model is a dict bundle ({"pipeline": Pipeline(prep, model), ...metadata})
+# written uncompressed, so its NumPy arrays can be memory-mapped on load and
+# shared between processes through the page cache.
+ROOT = Path(".").resolve()
+MODELS_DIR = Path(os.getenv("BIAGIO_MODELS_DIR", ROOT / "models"))
+RF_PARAMS = MODELS_DIR / "rf_params.json"          # written by tune_rf.py
+RF_KEYS = ("n_estimators", "max_depth", "min_samples_leaf")
+
+def model_path(name: str) -> Path:
+    return MODELS_DIR / f"{name}.joblib"
+
+def save_model(name: str, bundle: dict) -> Path:
+    out = model_path(name)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = caminho_temporario(out)           # unique per writer: parallel stages can save at once
+    try:
+        joblib.dump(bundle, tmp)
+        tmp.replace(out)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return out
+
+def load_model(name: str, mmap: bool = True) -> dict:
+    """Load a bundle; mmap=True maps its arrays read-only (use False to modify the model)."""
+    path = model_path(name)
+    if not path.exists():
+        raise FileNotFoundError(f"Model '{name}' not found at {path}. Run src/model_train.py first.")
+    return joblib.load(path, mmap_mode="r" if mmap else None)
+
+def save_rf_params(params: dict) -> Path:
+    RF_PARAMS.parent.mkdir(parents=True, exist_ok=True)
+    tmp = caminho_temporario(RF_PARAMS)
+    try:
+        tmp.write_text(json.dumps(params, indent=2), encoding="utf-8")
+        tmp.replace(RF_PARAMS)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return RF_PARAMS
+
+def rf_params(n_estimators: int) -> dict:
+    """RandomForestRegressor settings: the tuned config if there is one, else the script's default size."""
+    params = {"n_estimators": n_estimators}
+    if RF_PARAMS.exists():
+        tuned = json.loads(RF_PARAMS.read_text(encoding="utf-8"))
+        params.update({k: tuned[k] for k in RF_KEYS if k in tuned})
+    return params
@@ -1,28 +1,61 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import tempfile
+import time
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.ensemble import (RandomForestRegressor, ExtraTreesRegressor,
+                              HistGradientBoostingRegressor)
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error, r2_score
+
+from data_access import linhas_periodo, load_sales
+from feature_cache import dump_matrix, load_design, load_matrix
+from metrics_engine import regression_metrics, segment_codes, segment_metrics, split_metrics
+from model_store import save_model, load_model, rf_params
+from streaming import train_streaming
+from forest_kernel import ForestKernel
+from instrumentacao import etapa, instrumentar
 
 # Paths
 ROOT = Path(".").resolve()
 DATA = ROOT / "data" / "processed" / "dataset_biagio_clean.xlsx"
 OUT  = ROOT / "reports" / "model_results.xlsx"
+OUT_INTERVALS = ROOT / "reports" / "rf_prediction_intervals.parquet"
 
 TARGET = "Vendas"
 
+# CLI: python src/model_train.py [--zoo[=lr,rf,hgb,et,ridge]] [--cores=N]
+#                                [--cv[=folds]] [--horizon=months] [--lags] [--intervals[=0.8]]
+#      python src/model_train.py --incremental [--new-trees=50] [--max-trees=300]
+#                                [--window=12] [--compare-full]
+#      python src/model_train.py --stream[=path] [--chunksize=100000] [--hash-bits=18] [--epochs=3]
+FLAGS = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "")
+             for a in sys.argv[1:] if a.startswith("--"))
+
+# Model zoo: key -> (label in the results sheets, factory(n_jobs))
+ZOO = {
+    "lr":    ("Linear Regression", lambda n_jobs: LinearRegression()),
+    "rf":    ("Random Forest", lambda n_jobs: RandomForestRegressor(**rf_params(300), random_state=42,
+                                                                    n_jobs=n_jobs)),
+    "hgb":   ("HistGradientBoosting", lambda n_jobs: HistGradientBoostingRegressor(random_state=42)),
+    "et":    ("Extra Trees", lambda n_jobs: ExtraTreesRegressor(n_estimators=300, random_state=42,
+                                                                n_jobs=n_jobs)),
+    "ridge": ("Ridge", lambda n_jobs: Ridge(alpha=1.0)),
+}
+PARALLEL_MODELS = {"rf", "et"}      # estimators that use n_jobs internally
+
 def split_temporal(df: pd.DataFrame, target: str):
     """
     Split 80/20 temporal if 'Ano'+'Mês' exist; else random split.
     Returns: X_train, X_test, y_train, y_test, df_complete
     """
     if {"Ano", "Mês"}.issubset(df.columns):
-        df = df.sort_values(["Ano", "Mês"])
+        if "periodos" not in df.attrs:        # load_sales já devolve o frame ordenado por período
+            df = df.sort_values(["Ano", "Mês"])
         split_idx = int(len(df) * 0.8)
         train_df, test_df = df.iloc[:split_idx], df.iloc[split_idx:]
         X_train, y_train = train_df.drop(columns=[target]), train_df[target]
@@ -36,66 +69,364 @@ def split_temporal(df: pd.DataFrame, target: str):
         )
         return X_train, X_test, y_train, y_test, df
 
-def evaluate(model, X_train, y_train, X_test, y_test):
-    """Calculate RMSE, MAPE, R² for train and test."""
-    pred_train = model.predict(X_train)
-    rmse_train = np.sqrt(mean_squared_error(y_train, pred_train))
-    mape_train = mean_absolute_percentage_error(y_train, pred_train)
-    r2_train = r2_score(y_train, pred_train)
-
-    pred_test = model.predict(X_test)
-    rmse_test = np.sqrt(mean_squared_error(y_test, pred_test))
-    mape_test = mean_absolute_percentage_error(y_test, pred_test)
-    r2_test = r2_score(y_test, pred_test)
-
-    return rmse_train, mape_train, r2_train, rmse_test, mape_test, r2_test
-
-def evaluate_global(model, df: pd.DataFrame, target: str):
-    """Calculate metrics on the full dataset (100%)."""
-    X_all = df.drop(columns=[target])
-    y_all = df[target]
-    pred_all = model.predict(X_all)
-    rmse_all = np.sqrt(mean_squared_error(y_all, pred_all))
-    mape_all = mean_absolute_percentage_error(y_all, pred_all)
-    r2_all = r2_score(y_all, pred_all)
-    return rmse_all, mape_all, r2_all
+def split_positions(df: pd.DataFrame):
+    """
+    Same 80/20 split as split_temporal, as row positions into df (slices when
+    the split is temporal), so the cached feature matrix can be sliced directly.
+    Returns: train_pos, test_pos
+    """
+    n = len(df)
+    if {"Ano", "Mês"}.issubset(df.columns):
+        assert "periodos" in df.attrs, "Expected the period-sorted frame from load_sales"
+        split_idx = int(n * 0.8)
+        return slice(0, split_idx), slice(split_idx, n)
+    train_pos, test_pos = train_test_split(np.arange(n), test_size=0.2, random_state=42)
+    return train_pos, test_pos
+
+DENSE_MODELS = {"hgb"}               # estimators that reject sparse input
+
+def _dump_design(mmap_dir, Xt, y):
+    """Encoded matrix (kept sparse, see feature_cache.dump_matrix) + target for the workers."""
+    dump_matrix(mmap_dir, Xt)
+    np.save(Path(mmap_dir) / "y.npy", np.asarray(y, dtype=np.float64))
+
+def _rows(X, rows, key):
+    """Rows of the mapped design matrix, densified only for the models in DENSE_MODELS."""
+    X = X[rows]
+    return X.toarray() if key in DENSE_MODELS and hasattr(X, "toarray") else X
+
+def model_name(label: str) -> str:
+    """'Random Forest' -> 'random_forest' (file name under models/)."""
+    return label.lower().replace(" ", "_")
+
+def _bundle(preproc, model, last_period):
+    """Persisted form of a fitted model: encoder + estimator as one Pipeline, plus training metadata."""
+    bundle = {"pipeline": Pipeline([("prep", preproc), ("model", model)]), "last_period": last_period}
+    if hasattr(model, "estimators_"):        # per-tree training period, for --incremental
+        bundle["tree_periods"] = [last_period] * len(model.estimators_)
+    return bundle
+
+def _fit_zoo_member(args):
+    """Worker: fit one model on the memory-mapped design matrix, score it and persist it."""
+    key, n_jobs, mmap_dir, n_train, preproc, last_period, segment_labels = args
+    X = load_matrix(mmap_dir)
+    y = np.load(Path(mmap_dir) / "y.npy", mmap_mode="r")
+    codes = {d: (np.load(Path(mmap_dir) / f"seg_{i}.npy", mmap_mode="r"), labels)
+             for i, (d, labels) in enumerate(segment_labels.items())}
+    label, factory = ZOO[key]
+    model = factory(n_jobs)
+
+    t0 = time.perf_counter()
+    model.fit(_rows(X, slice(0, n_train), key), y[:n_train])
+    fit_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pred = model.predict(_rows(X, slice(None), key))   # one pass over the full frame
+    predict_s = time.perf_counter() - t0
+
+    tt, gl = split_metrics(y, pred, slice(0, n_train), slice(n_train, None))
+    seg = segment_metrics(y, pred, codes, {"Teste": slice(n_train, None), "Global": slice(None)})
+    if preproc is not None:
+        save_model(model_name(label), _bundle(preproc, model, last_period))
+    return label, tt, gl, fit_s, predict_s, seg
+
+def train_zoo(Xt, y, train_pos, test_pos, keys, cores=None, preproc=None, last_period=None, codes=None):
+    """
+    Write the encoded matrix (train rows first, still sparse) to memory-mapped
+    .npy files and train the selected models concurrently under a core budget. Tree ensembles
+    get cores // n_concurrent threads each. With `preproc`, every fitted model
+    is persisted to models/ as a full pipeline.
+    Returns the comparacao_modelos and global DataFrames with timing columns,
+    and the per-segment table (codes from metrics_engine.segment_codes).
+    """
+    cores = cores or os.cpu_count() or 1
+    codes = codes or {}
+    rows = np.arange(len(y))
+    order = np.r_[rows[train_pos], rows[test_pos]]
+    n_train = len(rows[train_pos])
+    y = np.asarray(y, dtype=np.float64)[order]
+    Xt = Xt[order]
+
+    n_workers = max(1, min(len(keys), cores))
+    per_model = max(1, cores // n_workers)
+    with tempfile.TemporaryDirectory(prefix="zoo_") as mmap_dir:
+        _dump_design(mmap_dir, Xt, y)
+        del Xt
+        for i, (c, _) in enumerate(codes.values()):
+            np.save(Path(mmap_dir) / f"seg_{i}.npy", c[order])
+        segment_labels = {d: labels for d, (_, labels) in codes.items()}
+        tasks = [(k, per_model if k in PARALLEL_MODELS else 1, mmap_dir, n_train, preproc, last_period,
+                  segment_labels) for k in keys]
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            results = list(ex.map(_fit_zoo_member, tasks))
+
+    df_tt = pd.DataFrame(
+        [[label] + list(tt) + [fit_s, pred_s] for label, tt, _, fit_s, pred_s, _ in results],
+        columns=["Modelo", "RMSE_Treino", "MAPE_Treino", "R2_Treino",
+                 "RMSE_Teste", "MAPE_Teste", "R2_Teste", "Fit_s", "Predict_s"])
+    df_gl = pd.DataFrame(
+        [[label] + list(gl) + [fit_s, pred_s] for label, _, gl, fit_s, pred_s, _ in results],
+        columns=["Modelo", "RMSE_Global", "MAPE_Global", "R2_Global", "Fit_s", "Predict_s"])
+    df_seg = pd.concat([seg.assign(Modelo=label)[["Modelo"] + list(seg.columns)]
+                        for label, *_, seg in results], ignore_index=True)
+    return df_tt, df_gl, df_seg
+
+def _period_label(p) -> str:
+    return f"{(int(p) - 1) // 12}-{(int(p) - 1) % 12 + 1:02d}"
+
+def walk_forward_folds(df: pd.DataFrame, n_folds: int = 5, horizon: int = 3):
+    """
+    Expanding-window folds over the Ano/Mês periods of the period-sorted frame:
+    fold k tests on `horizon` consecutive periods and trains on every period
+    before them. Folds never cut a month in two. Returns a list of
+    (train_slice, test_slice, first_test_period, last_test_period).
+    """
+    periods = df.attrs["periodos"]["chave"]
+    n_folds = min(n_folds, (len(periods) - 1) // horizon)
+    assert n_folds > 0, f"Not enough periods ({len(periods)}) for horizon={horizon}"
+    folds = []
+    for k in range(n_folds, 0, -1):
+        start = len(periods) - k * horizon
+        end = start + horizon - 1
+        folds.append((linhas_periodo(df, None, periods[start - 1]),
+                      linhas_periodo(df, periods[start], periods[end]),
+                      periods[start], periods[end]))
+    return folds
+
+def _fit_fold(args):
+    """Worker: fit one model on a fold's training rows (memory-mapped views) and score its test rows."""
+    key, n_jobs, mmap_dir, fold, train_rows, test_rows = args
+    X = load_matrix(mmap_dir)
+    y = np.load(Path(mmap_dir) / "y.npy", mmap_mode="r")
+    label, factory = ZOO[key]
+    model = factory(n_jobs)
+
+    t0 = time.perf_counter()
+    model.fit(_rows(X, train_rows, key), y[train_rows])
+    fit_s = time.perf_counter() - t0
+    pred = model.predict(_rows(X, test_rows, key))
+    return label, fold, regression_metrics(y[test_rows], pred), fit_s
+
+def walk_forward_cv(df, Xt, y, keys, n_folds=5, horizon=3, cores=None):
+    """
+    Walk-forward backtest: every (model, fold) pair runs in a process pool over
+    one memory-mapped copy of the (sparse) design matrix; folds are row slices
+    of the period-sorted frame, so no per-fold copies of the data are made.
+    Returns (per-fold DataFrame, per-model mean/std DataFrame).
+    """
+    cores = cores or os.cpu_count() or 1
+    folds = walk_forward_folds(df, n_folds, horizon)
+    n_workers = max(1, min(len(keys) * len(folds), cores))
+    per_model = max(1, cores // n_workers)
+    with tempfile.TemporaryDirectory(prefix="cv_") as mmap_dir:
+        _dump_design(mmap_dir, Xt, y)
+        tasks = [(k, per_model if k in PARALLEL_MODELS else 1, mmap_dir, i, tr, te)
+                 for k in keys for i, (tr, te, _, _) in enumerate(folds, 1)]
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            results = list(ex.map(_fit_fold, tasks))
+
+    df_folds = pd.DataFrame(
+        [[label, i, _period_label(folds[i - 1][2]), _period_label(folds[i - 1][3]),
+          folds[i - 1][0].stop, folds[i - 1][1].stop - folds[i - 1][1].start] + list(m) + [fit_s]
+         for label, i, m, fit_s in results],
+        columns=["Modelo", "Fold", "Teste_de", "Teste_ate", "N_Treino", "N_Teste",
+                 "RMSE", "MAPE", "R2", "Fit_s"])
+    df_summary = (df_folds.groupby("Modelo", sort=False)[["RMSE", "MAPE", "R2"]]
+                  .agg(["mean", "std"]))
+    df_summary.columns = [f"{m}_{stat}" for m, stat in df_summary.columns]
+    return df_folds, df_summary.reset_index()
 
+def retrain_incremental(df, new_trees=50, max_trees=300, window=12, compare_full=False):
+    """
+    Warm-start update of the persisted Random Forest: `new_trees` trees are
+    grown on the periods after the one it was last trained on plus the
+    `window` periods before them, and the oldest trees are retired so the
+    forest never exceeds `max_trees`. The persisted encoder is reused (the
+    existing trees depend on its columns); categories it has never seen are
+    ignored until the next full run of this script.
+    Returns a DataFrame with metrics on the new periods and on 100% of the
+    data, before and after the update (and for a full refit if requested).
+    """
+    bundle = load_model("random_forest", mmap=False)
+    assert bundle.get("last_period") is not None, "Incremental retraining needs the Ano/Mês periods"
+    prep, rf = bundle["pipeline"].named_steps["prep"], bundle["pipeline"].named_steps["model"]
+    periods = df.attrs["periodos"]["chave"]
+    n_new = sum(p > bundle["last_period"] for p in periods)
+    if not n_new:
+        print(f"✅ No periods after {_period_label(bundle['last_period'])}: model is up to date.")
+        return None
+
+    X = prep.transform(df.drop(columns=[TARGET]))
+    y = df[TARGET].to_numpy(dtype=np.float64)
+    new_rows = linhas_periodo(df, periods[-n_new], None)
+    win_rows = linhas_periodo(df, periods[max(0, len(periods) - n_new - window)], None)
+
+    def _row(label, model, fit_s):
+        pred = model.predict(X)
+        return ([label] + list(regression_metrics(y[new_rows], pred[new_rows]))
+                + list(regression_metrics(y, pred)) + [len(model.estimators_), fit_s])
+
+    rows = [_row("Random Forest (persisted)", rf, 0.0)]
+
+    t0 = time.perf_counter()
+    rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + new_trees)
+    rf.fit(X[win_rows], y[win_rows])                 # only the new trees are grown
+    retired = max(0, len(rf.estimators_) - max_trees)
+    rf.estimators_ = rf.estimators_[retired:]
+    rf.set_params(warm_start=False, n_estimators=len(rf.estimators_))
+    tree_periods = (bundle["tree_periods"] + [periods[-1]] * new_trees)[retired:]
+    rows.append(_row("Random Forest (incremental)", rf, time.perf_counter() - t0))
+
+    if compare_full:
+        t0 = time.perf_counter()
+        full = RandomForestRegressor(**dict(rf_params(max_trees), n_estimators=max_trees),
+                                     random_state=42, n_jobs=-1).fit(X, y)
+        rows.append(_row("Random Forest (full refit)", full, time.perf_counter() - t0))
+
+    save_model("random_forest", dict(bundle, last_period=periods[-1], tree_periods=tree_periods))
+    print(f"🚀 +{new_trees} trees on {win_rows.stop - win_rows.start} rows "
+          f"({n_new} new periods + {window} before), {retired} oldest retired.")
+    return pd.DataFrame(rows, columns=["Modelo", "RMSE_Novos", "MAPE_Novos", "R2_Novos",
+                                       "RMSE_Global", "MAPE_Global", "R2_Global", "Arvores", "Fit_s"])
+
+def prediction_intervals(preproc, rf, df, y, sets: dict, level: float = 0.8, chunk=None):
+    """
+    Random Forest prediction intervals from the spread of the per-tree predictions:
+    the forest is compiled once (forest_kernel), all trees are evaluated in one
+    batched pass per block of rows and the quantiles are taken across trees.
+    Returns (per-row intervals for the last set, coverage table per set); the
+    spread reflects model variance only, hence the coverage check on the test periods.
+    """
+    kernel = ForestKernel.compile(preproc, rf)
+    qs = [(1 - level) / 2, 0.5, 1 - (1 - level) / 2]
+    rows, per_row = [], None
+    for name, pos in sets.items():
+        part = df.iloc[pos]
+        t0 = time.perf_counter()
+        q = kernel.predict_quantiles(part, qs, chunk)
+        elapsed = time.perf_counter() - t0
+        yy = y[pos]
+        inside = (yy >= q[:, 0]) & (yy <= q[:, 2])
+        width = q[:, 2] - q[:, 0]
+        rows.append([name, level, len(yy), inside.mean(), width.mean(), np.median(width),
+                     (yy < q[:, 0]).mean(), (yy > q[:, 2]).mean(), elapsed])
+        per_row = part.reset_index().assign(Inferior=q[:, 0], Mediana=q[:, 1], Superior=q[:, 2],
+                                            Dentro=inside)
+    cover = pd.DataFrame(rows, columns=["Conjunto", "Nivel", "N", "Cobertura", "Largura_media",
+                                        "Largura_mediana", "Abaixo", "Acima", "Tempo_s"])
+    return per_row, cover
+
+def append_sheet(sheet: str, table: pd.DataFrame, title: str):
+    """Write/replace one sheet of model_results.xlsx, keeping the others."""
+    OUT.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(OUT, engine="openpyxl", **({"mode": "a", "if_sheet_exists": "replace"}
+                                                  if OUT.exists() else {})) as writer:
+        table.to_excel(writer, sheet_name=sheet, index=False)
+    print(f"\n=== {title} ===")
+    print(table)
+    print("\n✅ Results saved to:", OUT)
+
+@instrumentar("model_train")
 def main():
-    # 1) Load data
-    df = pd.read_excel(DATA)
+    if "incremental" in FLAGS:
+        df = load_sales(DATA)
+        with etapa("retrain_incremental"):
+            report = retrain_incremental(df, int(FLAGS.get("new-trees") or 50),
+                                         int(FLAGS.get("max-trees") or 300),
+                                         int(FLAGS.get("window") or 12), "compare-full" in FLAGS)
+        if report is not None:
+            append_sheet("retreino_incremental", report, "Incremental retraining")
+        return
+
+    if "stream" in FLAGS:
+        # out-of-core: chunks + hashed categoricals + SGDRegressor.partial_fit (flat memory)
+        with etapa("train_streaming"):
+            _, _, report = train_streaming(Path(FLAGS["stream"]) if FLAGS["stream"] else DATA,
+                                           chunksize=int(FLAGS.get("chunksize") or 100_000),
+                                           bits=int(FLAGS.get("hash-bits") or 18),
+                                           epochs=int(FLAGS.get("epochs") or 3))
+        append_sheet("streaming", report, "Streaming SGD (temporal hold-out)")
+        return
+
+    # 1) Load data + encoded design matrix (numeric = passthrough; categorical = OneHot),
+    #    shared with feature_importance through the feature cache
+    #    (--lags: + Cliente×Produto lag/rolling features from src/lag_features.py)
+    with etapa("load_design"):
+        df, preproc, Xt, _ = load_design(DATA, TARGET, lags="lags" in FLAGS)
     assert TARGET in df.columns, f"Target column '{TARGET}' not found. Columns: {list(df.columns)}"
+    y = df[TARGET].to_numpy(dtype=np.float64)
+    codes = segment_codes(df)
 
     # 2) Split 80/20
-    X_train, X_test, y_train, y_test, df_all = split_temporal(df, TARGET)
-
-    # 3) Preprocessing (numeric = passthrough; categorical = OneHot)
-    num_cols = X_train.select_dtypes(include=np.number).columns.tolist()
-    cat_cols = [c for c in X_train.columns if c not in num_cols]
-    preproc = ColumnTransformer(
-        transformers=[
-            ("num", "passthrough", num_cols),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
-        ]
-    )
+    train_pos, test_pos = split_positions(df)
+    X_train, y_train = Xt[train_pos], y[train_pos]
+    n_train = X_train.shape[0]
+    shapes = (n_train, df.shape[1] - 1), (len(df) - n_train, df.shape[1] - 1)
+    # last period seen in training (None without Ano/Mês)
+    last = int(df.index[n_train - 1]) if "periodos" in df.attrs else None
+
+    keys = ["lr", "rf"]
+    if "zoo" in FLAGS:
+        keys = [k.strip() for k in FLAGS["zoo"].split(",") if k.strip()] or list(ZOO)
+        unknown = [k for k in keys if k not in ZOO]
+        assert not unknown, f"Unknown models {unknown}. Options: {list(ZOO)}"
+        # the zoo keeps no fitted RF for the per-tree quantiles; run --intervals without --zoo
+        assert "intervals" not in FLAGS, "--intervals needs the default LR/RF run; it cannot be combined with --zoo"
+    cores = int(FLAGS["cores"]) if FLAGS.get("cores") else None
+
+    # Optional walk-forward backtest over Ano/Mês periods (extra sheets)
+    extra = {}
+    if "cv" in FLAGS:
+        with etapa("walk_forward_cv"):
+            df_folds, df_cv = walk_forward_cv(df, Xt, y, keys, int(FLAGS["cv"] or 5),
+                                              int(FLAGS.get("horizon") or 3), cores)
+        extra = {"walk_forward": df_folds, "walk_forward_resumo": df_cv}
+
+    if "zoo" in FLAGS:
+        with etapa("train_zoo"):
+            df_tt, df_all_metrics, df_seg = train_zoo(Xt, y, train_pos, test_pos, keys, cores, preproc, last,
+                                                      codes)
+        save_results(df_tt, df_all_metrics, *shapes, dict(extra, metricas_segmento=df_seg))
+        return
+
+    # 3) Each model predicts once on the full sorted matrix; train/test/global and
+    #    per-segment metrics are slices/reductions of that one prediction
+    seg_sets = {"Teste": test_pos, "Global": slice(None)}
 
     # ---------- Model 1: Linear Regression ----------
-    lr = Pipeline(steps=[("prep", preproc), ("model", LinearRegression())])
-    lr.fit(X_train, y_train)
-    res_lr_tt = evaluate(lr, X_train, y_train, X_test, y_test)
-    res_lr_all = evaluate_global(lr, df_all, TARGET)
+    lr = LinearRegression()
+    with etapa("linear_regression.fit"):
+        lr.fit(X_train, y_train)
+    with etapa("linear_regression.predict"):
+        pred_lr = lr.predict(Xt)
+    with etapa("linear_regression.metrics"):
+        res_lr_tt, res_lr_all = split_metrics(y, pred_lr, train_pos, test_pos)
+        seg_lr = segment_metrics(y, pred_lr, codes, seg_sets)
 
     # ---------- Model 2: Random Forest ----------
-    rf = Pipeline(steps=[("prep", preproc),
-                         ("model", RandomForestRegressor(n_estimators=300,
-                                                        random_state=42,
-                                                        n_jobs=-1))])
-    rf.fit(X_train, y_train)
-    res_rf_tt = evaluate(rf, X_train, y_train, X_test, y_test)
-    res_rf_all = evaluate_global(rf, df_all, TARGET)
+    rf = RandomForestRegressor(**rf_params(300), random_state=42, n_jobs=-1)   # tuned by tune_rf.py, if run
+    with etapa("random_forest.fit"):
+        rf.fit(X_train, y_train)
+    with etapa("random_forest.predict"):
+        pred_rf = rf.predict(Xt)
+    with etapa("random_forest.metrics"):
+        res_rf_tt, res_rf_all = split_metrics(y, pred_rf, train_pos, test_pos)
+        seg_rf = segment_metrics(y, pred_rf, codes, seg_sets)
 
-    # 4) Save results (two sheets in Excel)
-    OUT.parent.mkdir(parents=True, exist_ok=True)
+    # Persist both pipelines (models/*.joblib) for the prediction route and --incremental
+    with etapa("save_models"):
+        for label, model in (("Linear Regression", lr), ("Random Forest", rf)):
+            save_model(model_name(label), _bundle(preproc, model, last))
+
+    # Optional RF prediction intervals (per-tree quantiles) with coverage on the test periods
+    if "intervals" in FLAGS:
+        with etapa("prediction_intervals"):
+            per_row, cover = prediction_intervals(preproc, rf, df, y, {"Treino": train_pos, "Teste": test_pos},
+                                                  float(FLAGS["intervals"] or 0.8))
+            per_row.to_parquet(OUT_INTERVALS, index=False)
+        extra["intervalos_rf"] = cover
 
+    # 4) Save results (two sheets in Excel)
     cols_tt = ["Modelo", "RMSE_Treino", "MAPE_Treino", "R2_Treino",
                "RMSE_Teste", "MAPE_Teste", "R2_Teste"]
     df_tt = pd.DataFrame(
@@ -115,17 +446,31 @@ def main():
         columns=cols_all
     )
 
-    with pd.ExcelWriter(OUT, engine="openpyxl") as writer:
+    df_seg = pd.concat([seg.assign(Modelo=label)[["Modelo"] + list(seg.columns)]
+                        for label, seg in (("Linear Regression", seg_lr), ("Random Forest", seg_rf))],
+                       ignore_index=True)
+
+    save_results(df_tt, df_all_metrics, *shapes, dict(extra, metricas_segmento=df_seg))
+
+def save_results(df_tt, df_all_metrics, train_shape, test_shape, extra=None):
+    OUT.parent.mkdir(parents=True, exist_ok=True)
+
+    with etapa("save_results"), pd.ExcelWriter(OUT, engine="openpyxl") as writer:
         df_tt.to_excel(writer, sheet_name="comparacao_modelos", index=False)
         df_all_metrics.to_excel(writer, sheet_name="global", index=False)
+        for sheet, table in (extra or {}).items():
+            table.to_excel(writer, sheet_name=sheet, index=False)
 
     # Summary prints
     print("✅ Split done.")
-    print("Train:", X_train.shape, "| Test:", X_test.shape)
+    print("Train:", train_shape, "| Test:", test_shape)
     print("\n=== Comparison (Train/Test) ===")
     print(df_tt)
     print("\n=== Global Metrics (100%) ===")
     print(df_all_metrics)
+    for sheet, table in (extra or {}).items():
+        print(f"\n=== {sheet} ===")
+        print(table.head(20))
     print("\n✅ Results saved to:", OUT)
 
 if __name__ == "__main__":
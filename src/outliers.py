@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# =========================
+# Motor de outliers (z-score / MAD / IQR), opcionalmente por grupo
+# =========================
+# Cada regra é um dict:
+#   {"regra": "z"|"mad"|"iqr", "limiar": float, "colunas": [...] | None, "grupos": [...] | None}
+# colunas=None -> todas as colunas numéricas; grupos=None -> estatísticas globais.
+# As estatísticas são calculadas numa passagem agregada sobre um bloco NumPy só
+# com as colunas escolhidas e depois "espalhadas" pelas linhas via códigos de grupo.
+LIMIAR_PADRAO = {"z": 3.0, "mad": 3.5, "iqr": 1.5}
+REGRAS_PADRAO = [{"regra": "z", "limiar": 3.0, "colunas": None, "grupos": None}]
+
+def descrever_regra(r: dict) -> str:
+    lim = r.get("limiar", LIMIAR_PADRAO[r["regra"]])
+    txt = {"z": f"|z|>{lim:g}", "mad": f"|z_MAD|>{lim:g}", "iqr": f"fora de Q1/Q3 ± {lim:g}·IQR"}[r["regra"]]
+    extra = []
+    if r.get("colunas"):
+        extra.append(",".join(r["colunas"]))
+    if r.get("grupos"):
+        extra.append("por " + ",".join(r["grupos"]))
+    return txt + (f" [{'; '.join(extra)}]" if extra else "")
+
+def parse_regras(texto: str | None, colunas: str | None = None, grupos: str | None = None) -> list:
+    """Converte 'z:3,mad:3.5' (+ colunas/grupos separados por vírgulas) numa lista de regras."""
+    if not texto:
+        regras = [dict(r) for r in REGRAS_PADRAO]
+    else:
+        regras = []
+        for parte in texto.split(","):
+            nome, _, lim = parte.partition(":")
+            nome = nome.strip().lower()
+            if nome not in LIMIAR_PADRAO:
+                raise ValueError(f"❌ Regra de outliers desconhecida: '{nome}' (use z, mad ou iqr)")
+            regras.append({"regra": nome, "limiar": float(lim) if lim else LIMIAR_PADRAO[nome],
+                           "colunas": None, "grupos": None})
+    for r in regras:
+        if colunas:
+            r["colunas"] = [c.strip() for c in colunas.split(",")]
+        if grupos:
+            r["grupos"] = [g.strip() for g in grupos.split(",")]
+    return regras
+
+def _codigos(df: pd.DataFrame, grupos) -> tuple[np.ndarray, int]:
+    if not grupos:
+        return np.zeros(len(df), dtype=np.intp), 1
+    codes = df.groupby(list(grupos), sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    return codes.astype(np.intp), int(codes.max()) + 1 if len(codes) else 0
+
+def _scores_z(X: np.ndarray, codes: np.ndarray, n_g: int) -> np.ndarray:
+    # média e desvio-padrão (ddof=0, como scipy.stats.zscore) por grupo via bincount;
+    # NaN numa coluna propaga para o grupo (mesma semântica do zscore original)
+    cnt = np.bincount(codes, minlength=n_g).astype("float64")
+    Z = np.empty_like(X)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for j in range(X.shape[1]):
+            s1 = np.bincount(codes, weights=X[:, j], minlength=n_g)
+            mean = s1 / cnt
+            d = X[:, j] - mean[codes]
+            var = np.bincount(codes, weights=d * d, minlength=n_g) / cnt
+            Z[:, j] = d / np.sqrt(var)[codes]
+    return np.abs(Z)
+
+def mascara_outliers(df: pd.DataFrame, regras: list = REGRAS_PADRAO):
+    """
+    Devolve (mask_ok, contagens): mask_ok é True para as linhas a manter e
+    contagens[i] é o nº de linhas assinaladas pela regra i (uma linha pode ser
+    assinalada por várias regras).
+    """
+    mask_ok = np.ones(len(df), dtype=bool)
+    contagens = []
+    num_cols = df.select_dtypes(include="number").columns.tolist()
+    for r in regras:
+        cols = [c for c in (r.get("colunas") or num_cols) if c in df.columns]
+        if not cols or not len(df):
+            contagens.append(0)
+            continue
+        lim = r.get("limiar", LIMIAR_PADRAO[r["regra"]])
+        X = df[cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+        codes, n_g = _codigos(df, r.get("grupos"))
+
+        if r["regra"] == "z":
+            Z = _scores_z(X, codes, n_g)
+            if r.get("grupos"):
+                # grupos com dispersão nula (ex.: uma só linha) não têm outliers
+                Z = np.nan_to_num(Z, nan=0.0)
+            # sem grupos: NaN -> linha removida (semântica do scipy.stats.zscore)
+            with np.errstate(invalid="ignore"):
+                ok = (Z <= lim).all(axis=1)
+        else:
+            g = pd.DataFrame(X).groupby(codes)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if r["regra"] == "mad":
+                    med = g.median().to_numpy()[codes]
+                    dev = np.abs(X - med)
+                    gd = pd.DataFrame(dev).groupby(codes)
+                    mad = gd.median().to_numpy()[codes]
+                    # MAD = 0 (mais de metade dos valores iguais): desvio absoluto médio
+                    # escalado (Iglewicz & Hoaglin), senão qualquer dev > 0 daria inf
+                    z_mad = np.where(mad > 0, 0.6745 * dev / mad,
+                                     dev / (1.253314 * gd.mean().to_numpy()[codes]))
+                    fora = z_mad > lim
+                else:  # iqr
+                    q = g.quantile([0.25, 0.75])
+                    q1 = q.xs(0.25, level=1).to_numpy()[codes]
+                    q3 = q.xs(0.75, level=1).to_numpy()[codes]
+                    iqr = q3 - q1
+                    fora = (X < q1 - lim * iqr) | (X > q3 + lim * iqr)
+            # nas regras robustas, NaN (valor omisso ou dispersão nula sem desvio) não é outlier
+            ok = ~fora.any(axis=1)
+
+        contagens.append(int((~ok).sum()))
+        mask_ok &= ok
+    return mask_ok, contagens
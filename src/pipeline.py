@@ -0,0 +1,174 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from data_access import file_hash
+
+# =========================
+# Runner do pipeline com dependências
+# =========================
+# Cada etapa declara entradas e saídas; o código de que depende é o script mais
+# todos os módulos de src/ que ele importa, direta ou indiretamente (lidos com ast,
+# "codigo" só acrescenta ficheiros que não são importados). A impressão digital
+# (hash das entradas + código + argumentos) fica em data/cache/pipeline_state.json;
+# uma etapa é saltada se a impressão digital não mudou e as saídas existem.
+# As dependências resultam de "saída de A = entrada de B"; etapas independentes
+# correm em paralelo (subprocessos), no máximo JOBS_PADRAO de cada vez por omissão:
+# várias etapas treinam florestas com n_jobs=-1, por isso cada subprocesso recebe
+# também um teto de threads (cpu_count // jobs) para OpenMP/BLAS/joblib.
+#
+#   python src/pipeline.py [--jobs=N] [--force] [--only=etapa1,etapa2] [--dry-run]
+ROOT = Path(".").resolve()
+SRC = Path(__file__).resolve().parent
+STATE = ROOT / "data" / "cache" / "pipeline_state.json"
+JOBS_PADRAO = 2
+VARS_THREADS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "LOKY_MAX_CPU_COUNT")
+
+RAW   = "data/raw/dataset_biagio.xlsx"
+CLEAN = "data/processed/dataset_biagio_clean.xlsx"
+RF_PARAMS = "models/rf_params.json"       # opcional (tune_rf.py); em falta -> configuração por omissão
+RF_MODEL = "models/random_forest.joblib"  # escrito por model_train.py; compilado por forest_kernel.py
+
+STAGES = [
+    {"nome": "eda_raw", "script": "eda_raw.py",
+     "entradas": [RAW], "saidas": ["reports/eda_raw_outputs.xlsx", "reports/eda_raw_summary.txt"]},
+    {"nome": "clean_data", "script": "clean_data.py",
+     "entradas": [RAW], "saidas": [CLEAN, "reports/cleaning_summary.txt"]},
+    {"nome": "sweetviz_compare", "script": "sweetviz_compare_raw_clean.py",
+     "entradas": [RAW, CLEAN], "saidas": ["reports/sweetviz_raw_vs_clean.html"]},
+    {"nome": "lag_features", "script": "lag_features.py",
+     "entradas": [CLEAN], "saidas": ["data/processed/features_lag.parquet"]},
+    {"nome": "model_train", "script": "model_train.py",
+     "entradas": [CLEAN, RF_PARAMS], "saidas": ["reports/model_results.xlsx", RF_MODEL]},
+    {"nome": "forest_kernel", "script": "forest_kernel.py",
+     "entradas": [RF_MODEL], "saidas": ["models/random_forest_kernel/meta.json"]},
+    {"nome": "feature_importance", "script": "feature_importance.py",
+     "entradas": [CLEAN, RF_PARAMS], "saidas": ["reports/feature_importance.xlsx", "reports/feature_importance.png"]},
+    {"nome": "forecast_series", "script": "forecast_series.py",
+     "entradas": [CLEAN], "saidas": ["reports/forecast_series.xlsx"]},
+    {"nome": "plot_metrics", "script": "plot_metrics.py",
+     "entradas": ["reports/model_results.xlsx"],
+     "saidas": ["reports/plot_rmse_treino_teste.png", "reports/plot_mape_treino_teste.png",
+                "reports/plot_r2_treino_teste.png", "reports/plot_metricas_globais.png"]},
+]
+
+def dependencias(stages: list) -> dict:
+    produtor = {s: st["nome"] for st in stages for s in st["saidas"]}
+    return {st["nome"]: sorted({produtor[e] for e in st["entradas"] if e in produtor} - {st["nome"]})
+            for st in stages}
+
+def modulos_locais(script: str, vistos: set | None = None) -> set:
+    """O script e todos os módulos de src/ que importa (fecho transitivo, só imports ao nível do código)."""
+    vistos = set() if vistos is None else vistos
+    if script in vistos or not (SRC / script).exists():
+        return vistos
+    vistos.add(script)
+    for no in ast.walk(ast.parse((SRC / script).read_text(encoding="utf-8"))):
+        nomes = ([a.name for a in no.names] if isinstance(no, ast.Import)
+                 else [no.module] if isinstance(no, ast.ImportFrom) and no.module and not no.level
+                 else [])
+        for n in nomes:
+            modulos_locais(f"{n.split('.')[0]}.py", vistos)
+    return vistos
+
+def impressao_digital(st: dict) -> str:
+    h = hashlib.sha256()
+    for e in st["entradas"]:
+        p = ROOT / e
+        h.update(f"{e}={file_hash(p) if p.exists() else 'em falta'}\n".encode())
+    for c in sorted(modulos_locais(st["script"]) | set(st.get("codigo", []))):
+        h.update(f"{c}={file_hash(SRC / c)}\n".encode())
+    h.update(json.dumps(st.get("args", [])).encode())
+    return h.hexdigest()
+
+def _ler_estado() -> dict:
+    return json.loads(STATE.read_text(encoding="utf-8")) if STATE.exists() else {}
+
+def _gravar_estado(estado: dict):
+    STATE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(estado, indent=2), encoding="utf-8")
+    tmp.replace(STATE)
+
+def executar_etapa(st: dict, estado: dict, force: bool, dry_run: bool, threads: int | None = None) -> dict:
+    fp = impressao_digital(st)
+    em_dia = (not force and estado.get(st["nome"]) == fp
+              and all((ROOT / s).exists() for s in st["saidas"]))
+    if em_dia:
+        return {"estado": "em dia", "tempo": 0.0}
+    if dry_run:
+        return {"estado": "a executar (dry-run)", "tempo": 0.0}
+    t0 = time.perf_counter()
+    env = dict(os.environ)
+    if threads:
+        for v in VARS_THREADS:              # um valor já definido pelo utilizador prevalece
+            env.setdefault(v, str(threads))
+    proc = subprocess.run([sys.executable, str(SRC / st["script"])] + st.get("args", []),
+                          cwd=ROOT, capture_output=True, text=True, env=env)
+    dt = time.perf_counter() - t0
+    if proc.returncode != 0:
+        linhas = [l for l in proc.stderr.replace("\r", "\n").splitlines() if l.strip()]
+        erro = [l for l in linhas if "Error" in l or "Exception" in l][-1:] or linhas[-1:]
+        return {"estado": "falhou", "tempo": dt, "erro": erro}
+    # a impressão digital regista as entradas usadas nesta execução
+    return {"estado": "executada", "tempo": dt, "fp": fp}
+
+def correr(stages: list = STAGES, jobs: int | None = None, force: bool = False,
+           only: set | None = None, dry_run: bool = False) -> dict:
+    deps = dependencias(stages)
+    por_nome = {st["nome"]: st for st in stages}
+    alvo = set(only) if only else set(por_nome)
+    estado = _ler_estado()
+    resultados, a_correr = {}, {}
+    pendentes = [n for n in por_nome if n in alvo]
+    jobs = jobs or JOBS_PADRAO
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    t0 = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        while pendentes or a_correr:
+            for n in list(pendentes):
+                ds = [d for d in deps[n] if d in alvo]
+                if any(resultados.get(d, {}).get("estado") in ("falhou", "bloqueada") for d in ds):
+                    resultados[n] = {"estado": "bloqueada", "tempo": 0.0}
+                    pendentes.remove(n)
+                elif all(d in resultados for d in ds):
+                    a_correr[ex.submit(executar_etapa, por_nome[n], estado, force, dry_run, threads)] = n
+                    pendentes.remove(n)
+            if not a_correr:
+                continue
+            feitos, _ = wait(list(a_correr), return_when=FIRST_COMPLETED)
+            for f in feitos:
+                n = a_correr.pop(f)
+                resultados[n] = f.result()
+                if "fp" in resultados[n]:
+                    estado[n] = resultados[n].pop("fp")
+                    _gravar_estado(estado)
+                r = resultados[n]
+                print(f"  {n:<20} {r['estado']:<12} {r['tempo']:7.2f}s"
+                      + (f"  {r['erro']}" if r.get("erro") else ""), flush=True)
+
+    print(f"\n⏱️ Total: {time.perf_counter() - t0:.2f}s "
+          f"({sum(r['estado'] == 'executada' for r in resultados.values())} executadas, "
+          f"{sum(r['estado'] == 'em dia' for r in resultados.values())} em dia)")
+    return resultados
+
+def main():
+    flags = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "1")
+                 for a in sys.argv[1:] if a.startswith("--"))
+    print("🚀 Pipeline (etapa / estado / tempo):")
+    res = correr(jobs=int(flags["jobs"]) if "jobs" in flags else None,
+                 force="force" in flags,
+                 only=set(flags["only"].split(",")) if "only" in flags else None,
+                 dry_run="dry-run" in flags)
+    if any(r["estado"] in ("falhou", "bloqueada") for r in res.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from concurrent.futures import Future, TimeoutError as FuturesTimeout
+import os
+import queue
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+from model_store import load_model
+from forest_kernel import load_kernel
+
+# =========================
+# Previsões em JSON com micro-lotes
+# =========================
+# Os pipelines guardados por model_train.py (models/*.joblib) são carregados uma
+# vez por processo (worker do gunicorn), com os arrays mapeados em memória.
+# Os pedidos concorrentes (gunicorn --threads) entram numa fila; uma thread por
+# modelo junta-os em micro-lotes (até MAX_LOTE linhas ou ESPERA_MS de espera)
+# e faz UMA chamada vetorizada a predict por lote. Se existir um kernel compilado
+# e atualizado do modelo (forest_kernel.py), as previsões usam-no em vez do Pipeline.
+#
+#   POST /api/prever?modelo=random_forest
+#   {"linhas": [{"Ano": 2025, "Mês": 1, "Cliente": "...", "Produto": "...", ...}, ...]}
+#   -> {"modelo": "random_forest", "previsoes": [...]}
+MAX_LOTE = int(os.getenv("BIAGIO_LOTE_MAX", "4096"))
+ESPERA_MS = float(os.getenv("BIAGIO_LOTE_ESPERA_MS", "2"))
+TIMEOUT_S = float(os.getenv("BIAGIO_PREVISAO_TIMEOUT_S", "10"))
+MODELO_PADRAO = "random_forest"
+
+class MicroLotes:
+    def __init__(self, prever, max_lote: int = MAX_LOTE, espera_ms: float = ESPERA_MS):
+        self.prever = prever
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+        self._fila = queue.SimpleQueue()
+        threading.Thread(target=self._ciclo, daemon=True, name="micro-lotes").start()
+
+    def submeter(self, linhas: list) -> Future:
+        f = Future()
+        self._fila.put((linhas, f))
+        return f
+
+    def _ciclo(self):
+        while True:
+            pedidos = [self._fila.get()]
+            n = len(pedidos[0][0])
+            limite = time.perf_counter() + self.espera
+            while n < self.max_lote:
+                resto = limite - time.perf_counter()
+                if resto <= 0:
+                    break
+                try:
+                    pedidos.append(self._fila.get(timeout=resto))
+                except queue.Empty:
+                    break
+                n += len(pedidos[-1][0])
+            self._executar(pedidos)
+
+    def _executar(self, pedidos: list):
+        try:
+            linhas = [l for ls, _ in pedidos for l in ls]
+            pred = np.asarray(self.prever(pd.DataFrame.from_records(linhas)), dtype="float64")
+            fim = np.cumsum([len(ls) for ls, _ in pedidos])
+            for (_, f), a, b in zip(pedidos, np.r_[0, fim[:-1]], fim):
+                f.set_result(pred[a:b].tolist())
+        except Exception as e:
+            if len(pedidos) == 1:
+                pedidos[0][1].set_exception(e)
+            else:
+                # um pedido inválido não pode fazer falhar o lote inteiro: repetir um a um
+                for p in pedidos:
+                    self._executar([p])
+
+_servicos = {}
+_lock = threading.Lock()
+
+def servico(nome: str):
+    """(colunas esperadas, MicroLotes) do modelo, carregado uma vez por processo."""
+    with _lock:
+        s = _servicos.get(nome)
+        if s is None or s[0] != os.getpid():          # após fork, cada worker carrega o seu
+            pipe = load_model(nome)["pipeline"]
+            colunas = list(pipe.named_steps["prep"].feature_names_in_)
+            kernel = load_kernel(nome)
+            s = _servicos[nome] = (os.getpid(), colunas, MicroLotes(kernel.predict if kernel else pipe.predict))
+    return s[1], s[2]
+
+def _erro(msg: str, status: int):
+    return jsonify({"erro": msg}), status
+
+def registar_rota(server, rota: str = "/api/prever"):
+    """Regista a rota de previsão no servidor Flask da app Dash."""
+    @server.route(rota, methods=["POST"])
+    def prever():
+        nome = request.args.get("modelo", MODELO_PADRAO)
+        if not re.fullmatch(r"[a-z0-9_]+", nome):
+            return _erro(f"nome de modelo inválido: {nome!r}", 400)
+        corpo = request.get_json(silent=True)
+        linhas = corpo.get("linhas") if isinstance(corpo, dict) else corpo
+        if not isinstance(linhas, list) or not all(isinstance(l, dict) for l in linhas):
+            return _erro("esperado JSON {'linhas': [{coluna: valor, ...}, ...]}", 400)
+        if not linhas:
+            return jsonify({"modelo": nome, "previsoes": []})
+        try:
+            colunas, lotes = servico(nome)
+        except FileNotFoundError as e:
+            return _erro(str(e), 404)
+        em_falta = sorted({c for l in linhas for c in colunas if c not in l})
+        if em_falta:
+            return _erro(f"colunas em falta: {em_falta}", 400)
+        try:
+            previsoes = lotes.submeter(linhas).result(timeout=TIMEOUT_S)
+        except FuturesTimeout:
+            return _erro("tempo de previsão excedido", 503)
+        except Exception as e:
+            return _erro(f"erro na previsão: {e}", 400)
+        return jsonify({"modelo": nome, "previsoes": previsoes})
+    return prever
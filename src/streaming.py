@@ -0,0 +1,146 @@
+from pathlib import Path
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils import murmurhash3_32
+
+from data_access import iter_chunks, chave_periodo
+
+# =========================
+# Out-of-core training: chunks -> hashed features -> SGDRegressor.partial_fit
+# =========================
+# Memory is bounded by the chunk size: nothing is kept across chunks except the
+# scalers, the per-period row counts, the hashing table of the categories seen
+# and the model's fixed-width coefficient vector (2**hash_bits + numeric cols).
+#   pass 1: scaler statistics (features and target) + rows per period -> temporal cut
+#   pass 2..: partial_fit on the training periods (rows shuffled within each chunk)
+#   last pass: streamed train/hold-out metrics (running sums, Chan merge for R²)
+NUM_COLS = ["Ano", "Mês", "Margem_%", "Margem_Valor"]
+CAT_COLS = ["Cliente", "Produto", "Canal"]
+TARGET = "Vendas"
+_EPS = np.finfo(np.float64).eps
+
+class HashedEncoder:
+    """
+    Scaled numeric columns + hashing trick for the categoricals: every value
+    "col=valor" goes to one of 2**bits columns (sign from the hash, as in
+    sklearn's FeatureHasher). Hashes are computed once per distinct value and
+    rows are encoded with a vectorized lookup on the factorized codes.
+    """
+    def __init__(self, bits: int = 18, num_cols=NUM_COLS, cat_cols=CAT_COLS):
+        self.n_hash = 2 ** bits
+        self.num_cols, self.cat_cols = list(num_cols), list(cat_cols)
+        self.scaler = StandardScaler()
+        self._table = {}
+
+    @property
+    def n_features(self) -> int:
+        return len(self.num_cols) + self.n_hash
+
+    def _lookup(self, col: str, values: np.ndarray):
+        out = np.empty((len(values), 2), dtype=np.int64)
+        for i, v in enumerate(values):
+            tok = f"{col}={v}"
+            if tok not in self._table:
+                h = murmurhash3_32(tok, seed=0)
+                self._table[tok] = (abs(h) % self.n_hash, 1 if h >= 0 else -1)
+            out[i] = self._table[tok]
+        return out
+
+    def transform(self, chunk: pd.DataFrame) -> sp.csr_matrix:
+        n, m = len(chunk), len(self.num_cols)
+        num = np.nan_to_num(self.scaler.transform(chunk[self.num_cols].to_numpy(dtype=np.float64)))
+        cols = [np.broadcast_to(np.arange(m), (n, m))]
+        vals = [num]
+        for c in self.cat_cols:
+            codes, uniques = pd.factorize(chunk[c].astype(str), use_na_sentinel=False)
+            lut = self._lookup(c, np.asarray(uniques))
+            cols.append(m + lut[codes, 0][:, None])
+            vals.append(lut[codes, 1][:, None].astype(np.float64))
+        k = m + len(self.cat_cols)
+        return sp.csr_matrix((np.hstack(vals).ravel(), np.hstack(cols).ravel(), np.arange(0, n * k + 1, k)),
+                             shape=(n, self.n_features))
+
+class _Running:
+    """Streaming RMSE / MAPE / R² (sum of squared errors + Chan merge of the target variance)."""
+    def __init__(self):
+        self.n, self.sse, self.ape, self.mean, self.m2 = 0, 0.0, 0.0, 0.0, 0.0
+
+    def update(self, y, pred):
+        if not len(y):
+            return
+        e = pred - y
+        self.sse += float(e @ e)
+        self.ape += float((np.abs(e) / np.maximum(np.abs(y), _EPS)).sum())
+        nb, mb = len(y), float(y.mean())
+        m2b = float(((y - mb) ** 2).sum())
+        d, n = mb - self.mean, self.n + nb
+        self.mean += d * nb / n
+        self.m2 += m2b + d * d * self.n * nb / n
+        self.n = n
+
+    def result(self):
+        return (np.sqrt(self.sse / self.n), self.ape / self.n, 1 - self.sse / self.m2) if self.n else (np.nan,) * 3
+
+def _chunks(path, chunksize):
+    cols = NUM_COLS + CAT_COLS + [TARGET]
+    for chunk in iter_chunks(path, chunksize=chunksize, columns=cols):
+        chunk = chunk.dropna(subset=[TARGET, "Ano", "Mês"])
+        if len(chunk):
+            yield chunk, chave_periodo(chunk["Ano"], chunk["Mês"])
+
+def train_streaming(path: Path, chunksize: int = 100_000, bits: int = 18, epochs: int = 3,
+                    train_frac: float = 0.8, seed: int = 42):
+    """
+    Returns (model, encoder, metrics DataFrame). The hold-out is every period
+    after the one where the cumulative row count reaches `train_frac`, so a
+    month is never split between train and test.
+    """
+    t0 = time.perf_counter()
+    enc = HashedEncoder(bits)
+    y_scaler = StandardScaler()
+    counts = pd.Series(dtype="int64")
+    n_chunks = 0
+    for chunk, per in _chunks(path, chunksize):                          # pass 1
+        enc.scaler.partial_fit(chunk[enc.num_cols].to_numpy(dtype=np.float64))
+        y_scaler.partial_fit(chunk[[TARGET]].to_numpy(dtype=np.float64))
+        counts = counts.add(pd.Series(per).value_counts(), fill_value=0)
+        n_chunks += 1
+    counts = counts.sort_index()
+    cum = counts.cumsum().to_numpy()
+    cut = int(counts.index[min(np.searchsorted(cum, train_frac * cum[-1]), len(cum) - 2)])
+
+    model = SGDRegressor(loss="squared_error", penalty="l2", alpha=1e-6, learning_rate="invscaling",
+                         eta0=0.01, random_state=seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):                                              # passes 2..epochs+1
+        for chunk, per in _chunks(path, chunksize):
+            tr = np.flatnonzero(per <= cut)
+            if not len(tr):
+                continue
+            tr = rng.permutation(tr)
+            X = enc.transform(chunk.iloc[tr])
+            y = y_scaler.transform(chunk[[TARGET]].to_numpy(dtype=np.float64)[tr]).ravel()
+            model.partial_fit(X, y)
+
+    acc = {"Treino": _Running(), "Teste": _Running()}                      # last pass
+    for chunk, per in _chunks(path, chunksize):
+        y = chunk[TARGET].to_numpy(dtype=np.float64)
+        pred = y_scaler.inverse_transform(model.predict(enc.transform(chunk))[:, None]).ravel()
+        train = per <= cut
+        acc["Treino"].update(y[train], pred[train])
+        acc["Teste"].update(y[~train], pred[~train])
+
+    elapsed = time.perf_counter() - t0
+    metrics = pd.DataFrame(
+        [[name, a.n, *a.result()] for name, a in acc.items()],
+        columns=["Conjunto", "N", "RMSE", "MAPE", "R2"])
+    metrics["Ate_periodo"] = f"{(cut - 1) // 12}-{(cut - 1) % 12 + 1:02d}"
+    metrics["Blocos"] = n_chunks
+    metrics["Epocas"] = epochs
+    metrics["Hash_bits"] = bits
+    metrics["Tempo_s"] = elapsed
+    return model, enc, metrics
@@ -2,6 +2,8 @@ import pandas as pd
 import sweetviz as sv
 from pathlib import Path
 
+from data_access import read_table
+
 print("🚀 Sweetviz Raw vs Clean a arrancar…")
 
 RAW = Path("data/raw/dataset_biagio.xlsx")
@@ -11,8 +13,8 @@ OUT_HTML = REPORTS / "sweetviz_raw_vs_clean.html"
 
 def main():
     # Carregar datasets
-    df_raw = pd.read_excel(RAW)
-    df_clean = pd.read_excel(CLEAN)
+    df_raw = read_table(RAW)
+    df_clean = read_table(CLEAN)
 
     print(f"📊 Dataset bruto: {df_raw.shape} | Dataset limpo: {df_clean.shape}")
 
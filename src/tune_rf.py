@@ -0,0 +1,173 @@
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+
+from data_access import CACHE_DIR, file_hash
+from feature_cache import dump_matrix, load_design, load_matrix
+from model_store import RF_KEYS, save_rf_params
+
+# =========================
+# Random Forest tuning by successive halving, under a wall-clock budget
+# =========================
+# Candidates (n_estimators × max_depth × min_samples_leaf) are first scored on a
+# small nested subsample of the training rows; each round keeps the best 1/ETA
+# and multiplies the rows by ETA. Scoring is RMSE on a temporal validation block
+# (the last VAL_FRAC of the training rows, which precede the 80/20 test rows).
+# Every (config, rows) score is cached in data/cache, so a rerun resumes where the
+# budget ran out. The winner of the last round that every surviving candidate
+# finished goes to models/rf_params.json and is used by model_train.py and
+# feature_importance.py; if not even round 1 finished, the file is left as it is
+# and only the partial leaderboard is written.
+#
+#   python src/tune_rf.py [--budget=300] [--candidates=32] [--eta=3] [--jobs=N]
+ROOT = Path(".").resolve()
+DATA = ROOT / "data" / "processed" / "dataset_biagio_clean.xlsx"
+OUT  = ROOT / "reports" / "rf_tuning.xlsx"
+TARGET = "Vendas"
+
+SPACE = {
+    "n_estimators": [100, 200, 300, 500],
+    "max_depth": [None, 8, 16, 32],
+    "min_samples_leaf": [1, 2, 5, 10],
+}
+TRAIN_FRAC = 0.8          # same cut as model_train.split_positions
+VAL_FRAC = 0.2            # validation block at the end of the training rows
+MIN_ROWS = 100
+
+def candidates(n: int, seed: int = 42) -> list:
+    grid = [dict(zip(SPACE, v)) for v in itertools.product(*SPACE.values())]
+    idx = np.random.default_rng(seed).permutation(len(grid))[:n]
+    return [grid[i] for i in sorted(idx)]
+
+def _key(cfg: dict) -> str:
+    return json.dumps({k: cfg[k] for k in RF_KEYS}, sort_keys=True)
+
+def _score(args):
+    """Worker: fit on the first `rows` of the shuffled training rows, RMSE on the validation block."""
+    cfg, rows, mmap_dir = args
+    d = Path(mmap_dir)
+    X, y = load_matrix(d), np.load(d / "y.npy", mmap_mode="r")     # sparse: only `rows` are copied
+    fit_idx, n_val = np.load(d / "fit_idx.npy"), int(np.load(d / "n_val.npy"))
+    idx = np.sort(fit_idx[:rows])
+    t0 = time.perf_counter()
+    rf = RandomForestRegressor(**cfg, random_state=42, n_jobs=1).fit(X[idx], y[idx])
+    rmse = float(np.sqrt(mean_squared_error(y[-n_val:], rf.predict(X[-n_val:]))))
+    return rmse, time.perf_counter() - t0
+
+def successive_halving(Xt, y, n_candidates=32, eta=3, budget_s=300.0, jobs=None, cache_file=None):
+    """
+    Returns (best config, leaderboard DataFrame). Rounds stop early when the
+    budget is spent: pending fits are cancelled and the round is ranked on the
+    candidates that finished (`completa` = False in the leaderboard). The best
+    config is the winner of the last complete round, or None if round 1 did
+    not complete.
+    """
+    t_start = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    cache = json.loads(cache_file.read_text(encoding="utf-8")) if cache_file and cache_file.exists() else {}
+
+    n_fit = len(y) - max(1, int(len(y) * VAL_FRAC))
+    fit_idx = np.random.default_rng(42).permutation(n_fit)          # nested subsamples
+    alive = candidates(n_candidates)
+    n_rounds = max(1, math.ceil(math.log(len(alive), eta)))
+    rows = max(MIN_ROWS, n_fit // eta ** (n_rounds - 1))
+    board, best = [], None
+
+    with tempfile.TemporaryDirectory(prefix="tune_") as mmap_dir, \
+            ProcessPoolExecutor(max_workers=jobs) as ex:
+        d = Path(mmap_dir)
+        dump_matrix(d, Xt)
+        np.save(d / "y.npy", np.asarray(y, dtype=np.float64))
+        np.save(d / "fit_idx.npy", fit_idx)
+        np.save(d / "n_val.npy", np.array(len(y) - n_fit))
+
+        for rnd in range(n_rounds):
+            rows = min(rows, n_fit)
+            scores, pending = {}, {}
+            for cfg in alive:
+                k = f"{_key(cfg)}|{rows}"
+                if k in cache:
+                    scores[_key(cfg)] = cache[k]
+                else:
+                    pending[ex.submit(_score, (cfg, rows, mmap_dir))] = (cfg, k)
+            out_of_time = False
+            while pending:
+                left = budget_s - (time.perf_counter() - t_start)
+                done, _ = wait(list(pending), timeout=max(left, 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    # cancel what has not started; fits already running are kept (and cached)
+                    out_of_time = True
+                    for f in [f for f in pending if f.cancel()]:
+                        pending.pop(f)
+                    done, _ = wait(list(pending))
+                for f in done:
+                    cfg, k = pending.pop(f)
+                    rmse, fit_s = f.result()
+                    cache[k] = {"rmse": rmse, "fit_s": fit_s}
+                    scores[_key(cfg)] = cache[k]
+                if cache_file:
+                    cache_file.parent.mkdir(parents=True, exist_ok=True)
+                    cache_file.write_text(json.dumps(cache), encoding="utf-8")
+
+            ranked = sorted((c for c in alive if _key(c) in scores), key=lambda c: scores[_key(c)]["rmse"])
+            complete = len(ranked) == len(alive)
+            board += [dict(c, ronda=rnd + 1, linhas=rows, completa=complete, **scores[_key(c)]) for c in ranked]
+            if complete:
+                best = ranked[0]
+            print(f"  ronda {rnd + 1}: {len(ranked)}/{len(alive)} configs × {rows} linhas, "
+                  f"melhor RMSE={scores[_key(ranked[0])]['rmse']:.1f}" if ranked else
+                  f"  ronda {rnd + 1}: sem resultados dentro do orçamento", flush=True)
+            if out_of_time or not ranked or rows >= n_fit:
+                if out_of_time:
+                    print(f"⏱️ Orçamento de {budget_s:.0f}s esgotado; a retomar numa próxima execução.")
+                break
+            alive = ranked[:max(1, len(ranked) // eta)]
+            rows *= eta
+
+    return best, pd.DataFrame(board)
+
+def main():
+    flags = dict(a[2:].split("=", 1) if "=" in a else (a[2:], "1")
+                 for a in sys.argv[1:] if a.startswith("--"))
+    df, _, Xt, _ = load_design(DATA, TARGET)
+    n_train = int(len(df) * TRAIN_FRAC)
+    y = df[TARGET].to_numpy(dtype=np.float64)
+
+    digest = hashlib.sha256((file_hash(DATA) + json.dumps(SPACE) + f"{TRAIN_FRAC}|{VAL_FRAC}").encode())
+    cache_file = CACHE_DIR / f"rf_tuning__{digest.hexdigest()[:16]}.json"
+    print(f"🚀 Successive halving ({flags.get('candidates', 32)} candidatos, "
+          f"orçamento {flags.get('budget', 300)}s):")
+    best, board = successive_halving(Xt[:n_train], y[:n_train],
+                                     n_candidates=int(flags.get("candidates", 32)),
+                                     eta=int(flags.get("eta", 3)),
+                                     budget_s=float(flags.get("budget", 300)),
+                                     jobs=int(flags["jobs"]) if "jobs" in flags else None,
+                                     cache_file=cache_file)
+
+    if not board.empty:
+        OUT.parent.mkdir(parents=True, exist_ok=True)
+        board.to_excel(OUT, index=False)
+        print(f"📂 Ranking em {OUT}")
+    if best is None:
+        # the winner of a partial round is just whichever fit finished first: keep the current file
+        print("\n⚠️ Nenhuma ronda completa dentro do orçamento; models/rf_params.json não foi alterado.")
+        return
+    last = board.loc[board["completa"], "ronda"].max()
+    final = board[board["completa"] & (board["ronda"] == last)].iloc[0]      # rows are ranked by RMSE
+    path = save_rf_params({**best, "rmse_validacao": float(final["rmse"]), "linhas": int(final["linhas"])})
+    print(f"\n✅ Melhor configuração: {best}")
+    print(f"📂 Guardada em {path} (usada por model_train.py e feature_importance.py)")
+
+if __name__ == "__main__":
+    main()